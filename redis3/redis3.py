@@ -1,7 +1,390 @@
 import boto3
 import botocore
-from time import time
+from time import time, sleep
+import io
+import os
+import copy
+import json
+import math
+import uuid
+import random
+import zlib
+import struct
+import hashlib
+import itertools
+import threading
+import collections
+import urllib.parse
+import multiprocessing
 import concurrent.futures
+import multiprocessing.shared_memory
+import xml.etree.ElementTree as ElementTree
+import urllib3
+import botocore.auth
+import botocore.config
+import botocore.awsrequest
+import botocore.credentials
+
+
+# default tuning for the streaming ops (set_stream / get_stream / get_into):
+# note that s3 rejects multipart parts smaller than 5MB (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_CONCURRENCY = 10
+# connect / read timeouts (in seconds) used for ops with a deadline: we round the
+# remaining budget up to one of these, so that only a few clients get created
+TIMEOUT_STEPS = (0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 30, 60)
+# per-key statuses returned by mget / mset when partial results are requested
+STATUS_OK = 'ok'
+STATUS_MISSING = 'missing'
+STATUS_ERROR = 'error'
+STATUS_TIMEOUT = 'timed-out'
+# defaults for the negative-lookup (bloom) filter: target false positive rate, max age
+# in seconds before a rebuild from a full listing, and min number of keys it is sized for
+DEFAULT_BLOOM_ERROR_RATE = 0.01
+DEFAULT_BLOOM_REBUILD_INTERVAL = 3600
+MIN_BLOOM_CAPACITY = 1000
+# max seconds between syncs of a filter with the persisted one (see _sync_bloom_filter), and
+# max attempts of a sync when other clients keep updating the persisted filter concurrently
+DEFAULT_BLOOM_SYNC_INTERVAL = 5
+BLOOM_SYNC_MAX_RETRIES = 5
+# filters are persisted outside of the db prefixes, so they don't show up in keys()
+BLOOM_FILTER_PREFIX = '_bloom/'
+# size of the keep-alive connection pool of the fast path transport
+DEFAULT_FAST_PATH_CONNECTIONS = 50
+# fast path requests without a deadline are retried on throttling / server errors and on
+# connection errors, with jittered exponential backoff (as botocore does)
+FAST_PATH_MAX_ATTEMPTS = 3
+FAST_PATH_RETRY_BACKOFF = 0.05
+FAST_PATH_RETRY_STATUSES = (500, 502, 503, 504)
+# refresh s3 Express session credentials (which last 5 minutes) this many seconds before they expire
+SESSION_REFRESH_MARGIN = 60
+# defaults for dump_db / restore_db: keys per archive chunk, and concurrent s3 requests
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_BULK_CONCURRENCY = 50
+# restore checkpoints (i.e. which chunks of an archive are done) live outside of the db prefixes
+RESTORE_CHECKPOINT_PREFIX = '_restore/'
+ARCHIVE_MANIFEST = 'manifest.json'
+# each record in an archive chunk: key length, value length, key bytes, value bytes
+ARCHIVE_RECORD_HEADER = struct.Struct('>II')
+# lists are stored outside of the db prefixes, as one metadata object plus immutable chunks
+LIST_PREFIX = '_list/'
+# chunks with fewer items than DEFAULT_LIST_CHUNK_ITEMS get merged together, and a list gets
+# compacted in the background when more than this many of its chunks can be merged away
+LIST_COMPACTION_THRESHOLD = 64
+DEFAULT_LIST_CHUNK_ITEMS = 1000
+# max attempts at a conditional write of a list metadata object before giving up
+LIST_MAX_RETRIES = 30
+# base and cap of the (jittered, exponential) backoff between those attempts, in seconds:
+# with the cap, writers spread over about a second each round, however many they are
+LIST_RETRY_BACKOFF = 0.01
+LIST_RETRY_MAX_BACKOFF = 1.0
+# process pool mget: only batches of at least this many keys go to the pool, which splits them
+# in about BATCHES_PER_PROCESS batches per worker, each of MIN / MAX_PROCESS_BATCH keys
+MGET_PROCESS_THRESHOLD = 1000
+BATCHES_PER_PROCESS = 4
+MIN_PROCESS_BATCH = 100
+MAX_PROCESS_BATCH = 5000
+# concurrent GETs (and pooled connections) inside each worker process
+DEFAULT_PROCESS_THREADS = 32
+
+# the s3 client of a process pool worker (see _init_mget_worker)
+_worker_s3_client = None
+
+
+def _init_mget_worker(client_kwargs: dict):
+    """
+    Create the s3 client of a process pool worker, once per process.
+    """
+    global _worker_s3_client
+    kwargs = dict(client_kwargs)
+    pool_config = botocore.config.Config(max_pool_connections=DEFAULT_PROCESS_THREADS)
+    base_config = kwargs.pop('config', None)
+    kwargs['config'] = base_config.merge(pool_config) if base_config else pool_config
+    _worker_s3_client = boto3.client('s3', **kwargs)
+
+
+def _get_object_bytes(bucket_name: str, object_key: str):
+    try:
+        r = _worker_s3_client.get_object(Bucket=bucket_name, Key=object_key)
+    except botocore.exceptions.ClientError as e:
+        if e.response['Error']['Code'] == "NoSuchKey":
+            return None
+        raise e
+    
+    return r['Body'].read()
+
+
+def _mget_worker_batch(bucket_name: str, object_keys: list):
+    """
+    Get a batch of objects in a process pool worker, and copy their bytes into one shared 
+    memory block, so that only its name and the value lengths (-1 for missing keys) get 
+    pickled back to the parent, which is in charge of unlinking the block.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=DEFAULT_PROCESS_THREADS) as executor:
+        values = list(executor.map(lambda k: _get_object_bytes(bucket_name, k), object_keys))
+    lengths = [len(v) if v is not None else -1 for v in values]
+    shm = multiprocessing.shared_memory.SharedMemory(create=True, size=max(1, sum(l for l in lengths if l > 0)))
+    offset = 0
+    for v in values:
+        if v:
+            shm.buf[offset:offset + len(v)] = v
+            offset += len(v)
+    shm.close()
+    
+    return shm.name, lengths
+
+
+class BloomFilter():
+    """
+    A plain bloom filter over string keys: "key in bloom_filter" is False only if the key
+    was never added, and True for keys that were added plus about error_rate of the others, 
+    as long as no more than capacity keys were added.
+    
+    Ref: https://en.wikipedia.org/wiki/Bloom_filter
+    """
+    
+    # header: number of bits, capacity, count of added keys, number of hashes, error rate, build time
+    _HEADER = struct.Struct('>QQQIdd')
+    
+    def __init__(self, capacity: int, error_rate: float = DEFAULT_BLOOM_ERROR_RATE, built_at: float = None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.built_at = built_at if built_at is not None else time()
+        self.count = 0
+        # optimal size and number of hashes for the target false positive rate
+        self._m = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self._k = max(1, int(round(self._m / capacity * math.log(2))))
+        self._bits = bytearray((self._m + 7) // 8)
+    
+    def _positions(self, key: str):
+        # double hashing: k positions out of two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return [(h1 + i * h2) % self._m for i in range(self._k)]
+    
+    def add(self, key: str):
+        for p in self._positions(key):
+            self._bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+    
+    def __contains__(self, key: str):
+        return all(self._bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+    
+    def has_same_shape(self, other: 'BloomFilter'):
+        return (self._m, self._k) == (other._m, other._k)
+    
+    def merge(self, other: 'BloomFilter'):
+        """
+        Add all the keys of other (a filter with the same shape) to this one: as some keys
+        may be in both, the count is estimated from the number of bits set.
+        """
+        assert self.has_same_shape(other), "Cannot merge filters of different shapes"
+        bits = int.from_bytes(self._bits, 'big') | int.from_bytes(other._bits, 'big')
+        self._bits = bytearray(bits.to_bytes(len(self._bits), 'big'))
+        bits_set = min(bin(bits).count('1'), self._m - 1)
+        estimated_count = int(-self._m / self._k * math.log(1 - bits_set / self._m))
+        self.count = max(self.count, other.count, estimated_count)
+        # keep the age of the most recent build, so that the merged filter isn't rebuilt too soon
+        self.built_at = max(self.built_at, other.built_at)
+    
+    def is_full(self):
+        """
+        True when more keys than capacity were added, i.e. the false positive
+        rate is now above error_rate.
+        """
+        return self.count > self.capacity
+    
+    def to_bytes(self):
+        header = self._HEADER.pack(self._m, self.capacity, self.count, self._k, self.error_rate, self.built_at)
+        return zlib.compress(header + bytes(self._bits))
+    
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        data = zlib.decompress(data)
+        m, capacity, count, k, error_rate, built_at = cls._HEADER.unpack_from(data)
+        bloom_filter = cls(capacity, error_rate, built_at)
+        assert (bloom_filter._m, bloom_filter._k) == (m, k), "Unexpected filter shape {}".format((m, k))
+        bloom_filter.count = count
+        bloom_filter._bits = bytearray(data[cls._HEADER.size:])
+        return bloom_filter
+
+
+class FastPathTransport():
+    """
+    A minimal transport for the hot ops (GET / PUT / HEAD / DELETE of one object), which 
+    skips botocore's per-call machinery (parameter validation, event hooks, serialization
+    and parsing): requests are signed with cached s3 Express session credentials and sent 
+    over a keep-alive urllib3 pool.
+    
+    Methods mimic the boto3 ones (same arguments and the subset of the response we use, errors 
+    as ClientError, timeouts as ConnectTimeoutError / ReadTimeoutError), so the redis3Client code 
+    doesn't need to know which transport is in use. Requests use the connect / read timeouts
+    of the boto3 client, and are retried up to FAST_PATH_MAX_ATTEMPTS times on 5xx (e.g. 
+    SlowDown) and connection errors, except for transports with a deadline (see with_timeout).
+    
+    If endpoint_url is specified (e.g. a local s3 stand-in), requests are path-style and signed 
+    with plain SigV4 and the static credentials passed in, instead of the session ones.
+    """
+    
+    def __init__(
+        self,
+        s3_client,
+        availability_zone: str,
+        endpoint_url: str = None,
+        credentials: botocore.credentials.ReadOnlyCredentials = None,
+        max_connections: int = DEFAULT_FAST_PATH_CONNECTIONS
+        ):
+        # the boto3 client is only used to get session credentials (CreateSession)
+        self._s3_client = s3_client
+        self._region = s3_client.meta.region_name
+        self._availability_zone = availability_zone
+        self._endpoint_url = endpoint_url.rstrip('/') if endpoint_url else None
+        self._static_credentials = credentials
+        self._session_credentials = {}
+        self._lock = threading.Lock()
+        self._pool = urllib3.PoolManager(maxsize=max_connections)
+        # same defaults as the boto3 client (urllib3 would wait forever otherwise)
+        self._timeout = urllib3.Timeout(
+            connect=s3_client.meta.config.connect_timeout,
+            read=s3_client.meta.config.read_timeout
+            )
+        self._max_attempts = FAST_PATH_MAX_ATTEMPTS
+    
+    def with_timeout(self, timeout: float):
+        """
+        Return a transport sharing this one's pool and credentials, whose requests time out 
+        after timeout seconds in total, connection included (urllib3 takes the timeout per 
+        request, so this is cheap), with no retries, since a retry would not fit in the 
+        budget anyway.
+        """
+        transport = copy.copy(self)
+        transport._timeout = urllib3.Timeout(total=timeout)
+        transport._max_attempts = 1
+        return transport
+    
+    def _get_url(self, bucket: str, key: str):
+        quoted_key = urllib.parse.quote(key, safe='/~')
+        if self._endpoint_url is not None:
+            return '{}/{}/{}'.format(self._endpoint_url, bucket, quoted_key)
+        
+        return 'https://{}.s3express-{}.{}.amazonaws.com/{}'.format(
+            bucket, self._availability_zone, self._region, quoted_key)
+    
+    def _get_signer(self, bucket: str):
+        if self._endpoint_url is not None:
+            return botocore.auth.S3SigV4Auth(self._static_credentials, 's3', self._region)
+        
+        with self._lock:
+            credentials, expiration = self._session_credentials.get(bucket, (None, 0))
+            if expiration - time() < SESSION_REFRESH_MARGIN:
+                r = self._s3_client.create_session(Bucket=bucket)
+                credentials = botocore.credentials.ReadOnlyCredentials(
+                    r['Credentials']['AccessKeyId'],
+                    r['Credentials']['SecretAccessKey'],
+                    r['Credentials']['SessionToken']
+                    )
+                expiration = r['Credentials']['Expiration'].timestamp()
+                self._session_credentials[bucket] = (credentials, expiration)
+        
+        return botocore.auth.S3ExpressAuth(credentials, 's3express', self._region, identity_cache=None)
+    
+    def _send(self, method: str, bucket: str, url: str, body: bytes, headers: dict):
+        """
+        Sign and send one request, retrying on 5xx and connection errors (the request 
+        is signed again at each attempt, as the signature includes the time).
+        """
+        for attempt in range(self._max_attempts):
+            if attempt > 0:
+                sleep(random.uniform(0, FAST_PATH_RETRY_BACKOFF * 2 ** attempt))
+            request = botocore.awsrequest.AWSRequest(method=method, url=url, data=body, headers=dict(headers))
+            self._get_signer(bucket).add_auth(request)
+            is_last_attempt = attempt == self._max_attempts - 1
+            try:
+                r = self._pool.request(
+                    method,
+                    url,
+                    body=body or None,
+                    headers=dict(request.headers.items()),
+                    timeout=self._timeout,
+                    retries=False,
+                    redirect=False
+                    )
+            # NewConnectionError is a ConnectTimeoutError for urllib3, so it goes first
+            except urllib3.exceptions.NewConnectionError as e:
+                if is_last_attempt:
+                    raise botocore.exceptions.EndpointConnectionError(endpoint_url=url, error=e)
+                continue
+            except urllib3.exceptions.ConnectTimeoutError as e:
+                if is_last_attempt:
+                    raise botocore.exceptions.ConnectTimeoutError(endpoint_url=url, error=e)
+                continue
+            except urllib3.exceptions.ReadTimeoutError as e:
+                if is_last_attempt:
+                    raise botocore.exceptions.ReadTimeoutError(endpoint_url=url, error=e)
+                continue
+            except urllib3.exceptions.ProtocolError as e:
+                # e.g. the connection was reset
+                if is_last_attempt:
+                    raise botocore.exceptions.ConnectionClosedError(endpoint_url=url, error=e)
+                continue
+            if r.status not in FAST_PATH_RETRY_STATUSES or is_last_attempt:
+                return r
+    
+    def _request(self, operation_name: str, method: str, bucket: str, key: str, body: bytes = b'', headers: dict = None):
+        url = self._get_url(bucket, key)
+        r = self._send(method, bucket, url, body, headers or {})
+        if r.status >= 300:
+            # same shape as botocore errors, HEAD has no body so the code is the status
+            code, message = str(r.status), r.reason
+            if r.data:
+                try:
+                    error = ElementTree.fromstring(r.data)
+                    code = error.findtext('Code') or code
+                    message = error.findtext('Message') or message
+                except ElementTree.ParseError:
+                    pass
+            raise botocore.exceptions.ClientError(
+                {
+                    'Error': {'Code': code, 'Message': message},
+                    'ResponseMetadata': {'HTTPStatusCode': r.status, 'HTTPHeaders': dict(r.headers)}
+                },
+                operation_name
+                )
+        
+        return {
+            'Body': io.BytesIO(r.data),
+            'ContentLength': int(r.headers.get('Content-Length', 0)),
+            'ETag': r.headers.get('ETag'),
+            'LastModified': r.headers.get('Last-Modified'),
+        }
+    
+    def get_object(self, Bucket: str, Key: str, Range: str = None, IfMatch: str = None):
+        headers = {}
+        if Range is not None:
+            headers['Range'] = Range
+        if IfMatch is not None:
+            headers['If-Match'] = IfMatch
+        
+        return self._request('GetObject', 'GET', Bucket, Key, headers=headers)
+    
+    def put_object(self, Bucket: str, Key: str, Body, IfNoneMatch: str = None):
+        headers = {}
+        if IfNoneMatch is not None:
+            headers['If-None-Match'] = IfNoneMatch
+        
+        return self._request(
+            'PutObject', 'PUT', Bucket, Key,
+            body=Body.encode('utf-8') if isinstance(Body, str) else Body,
+            headers=headers
+            )
+    
+    def head_object(self, Bucket: str, Key: str):
+        return self._request('HeadObject', 'HEAD', Bucket, Key)
+    
+    def delete_object(self, Bucket: str, Key: str):
+        return self._request('DeleteObject', 'DELETE', Bucket, Key)
 
 
 class redis3Client():
@@ -13,6 +396,13 @@ class redis3Client():
         availability_zone: str = 'use1-az5',
         bucket_prefix: str = 'redis3',
         verbose: bool = False,
+        bloom_filter: bool = False,
+        bloom_error_rate: float = DEFAULT_BLOOM_ERROR_RATE,
+        bloom_rebuild_interval: float = DEFAULT_BLOOM_REBUILD_INTERVAL,
+        bloom_sync_interval: float = DEFAULT_BLOOM_SYNC_INTERVAL,
+        fast_path: bool = False,
+        fast_path_connections: int = DEFAULT_FAST_PATH_CONNECTIONS,
+        mget_processes: int = 0,
         **kwargs
         ):
         """
@@ -22,12 +412,51 @@ class redis3Client():
         
         You can also override the default bucket prefix by passing a different
         bucket_prefix.
+        
+        If bloom_filter is True, get / mget / exists check a per-db bloom filter 
+        first, and return without any s3 request for keys that are surely not 
+        there (see _bloom_might_contain for the details).
+        
+        If fast_path is True, single-key GET / PUT / HEAD / DELETE requests skip 
+        botocore and go through a FastPathTransport, with a pool of fast_path_connections
+        connections (boto3 is still used for everything else).
+        
+        If mget_processes is more than 0, very large mget calls are split across a
+        pool of that many worker processes (see _mget_multiprocess): call close() 
+        when you are done with the client, to stop them. Workers are spawned, i.e. 
+        they import your main module, so scripts using this need the usual 
+        'if __name__ == "__main__":' guard.
         """
         init_start_time = time()
         self.bucket_prefix = bucket_prefix
         
         # setup basic class attributes and objects
         self._s3_client = boto3.client('s3', **kwargs)
+        # keep the kwargs around to build clients with custom timeouts (see _get_s3_client)
+        self._s3_client_kwargs = kwargs
+        self._timed_s3_clients = {}
+        self._timed_s3_clients_lock = threading.Lock()
+        # negative-lookup filters, per db: filters in use, keys written while a filter is
+        # missing or being built (added to it once it's ready), and dbs with a (re)build running
+        self._bloom_filter_enabled = bloom_filter
+        self._bloom_error_rate = bloom_error_rate
+        self._bloom_rebuild_interval = bloom_rebuild_interval
+        self._bloom_sync_interval = bloom_sync_interval
+        self._bloom_filters = {}
+        self._bloom_building = {}
+        self._bloom_rebuilding = set()
+        # per db: ETag of the persisted filter we last merged, time of the last sync, keys
+        # added since the last sync, and whether a sync is running or scheduled
+        self._bloom_etags = {}
+        self._bloom_synced_at = {}
+        self._bloom_unsynced = {}
+        self._bloom_syncing = set()
+        self._bloom_lock = threading.Lock()
+        self._bloom_stats = collections.Counter()
+        # last known (metadata, ETag) of the lists we wrote to, and lists being compacted
+        self._list_meta_cache = {}
+        self._list_compacting = set()
+        self._list_lock = threading.Lock()
         self.bucket_name = self._get_bucket_from_cache_name(
             availability_zone,
             cache_name
@@ -61,6 +490,30 @@ class redis3Client():
             else:
                 raise e    
             
+        self._mget_processes = mget_processes
+        self._process_pool = None
+        self._process_pool_lock = threading.Lock()
+        self._fast_path = None
+        if fast_path:
+            credentials = None
+            if 'endpoint_url' in kwargs:
+                # no session auth outside of AWS: sign with the same credentials as boto3
+                credentials = boto3.session.Session(
+                    aws_access_key_id=kwargs.get('aws_access_key_id'),
+                    aws_secret_access_key=kwargs.get('aws_secret_access_key'),
+                    aws_session_token=kwargs.get('aws_session_token'),
+                    ).get_credentials()
+                if credentials is None:
+                    raise botocore.exceptions.NoCredentialsError()
+                credentials = credentials.get_frozen_credentials()
+            self._fast_path = FastPathTransport(
+                self._s3_client,
+                availability_zone,
+                endpoint_url=kwargs.get('endpoint_url'),
+                credentials=credentials,
+                max_connections=fast_path_connections
+                )
+            
         if self._verbose:
             print("Init completed in {:.4f}s".format(time() - init_start_time))
             
@@ -108,26 +561,74 @@ class redis3Client():
         """
         return '{}-{}--{}--x-s3'.format(self.bucket_prefix, cache_name, availability_zone)
     
-    def _get_object_key_from_key_name(self, key: str):
+    def _get_object_key_from_key_name(self, key: str, db: int = None):
         """
         Make sure that the key is prefixed with the db number as 
-        a natural namespacing of the keys
+        a natural namespacing of the keys (default to the current db)
+        """
+        return '{}/{}'.format(self.db if db is None else db, key)
+    
+    def _get_s3_client(self, deadline: float = None, fast_path: bool = False):
+        """
+        Return the s3 client to use for an op that must complete before deadline
+        (a time() value, None means no deadline). If fast_path is True and the
+        client was created with fast_path=True, return the FastPathTransport instead
+        (only for get_object, put_object, head_object and delete_object).
+        
+        boto3 timeouts are set per client, not per request, so we keep a small 
+        cache of clients with connect / read timeouts picked from TIMEOUT_STEPS 
+        (the smallest step covering the remaining budget, so a request that would 
+        complete in time is never cut short) and no retries, since a retry would not 
+        fit in the budget anyway. Callers enforce the budget itself by waiting on the 
+        request with a timeout (see _run_concurrently and _run_before_deadline).
         """
-        return '{}/{}'.format(self.db, key)
+        use_fast_path = fast_path and self._fast_path is not None
+        if deadline is None:
+            return self._fast_path if use_fast_path else self._s3_client
+        
+        remaining = deadline - time()
+        if remaining <= 0:
+            raise concurrent.futures.TimeoutError("Deadline expired")
+        if use_fast_path:
+            return self._fast_path.with_timeout(remaining)
+        step = min([s for s in TIMEOUT_STEPS if s >= remaining], default=TIMEOUT_STEPS[-1])
+        with self._timed_s3_clients_lock:
+            if step not in self._timed_s3_clients:
+                if self._verbose:
+                    print("Creating s3 client with {}s timeouts".format(step))
+                kwargs = dict(self._s3_client_kwargs)
+                timeout_config = botocore.config.Config(
+                    connect_timeout=step,
+                    read_timeout=step,
+                    retries={'total_max_attempts': 1}
+                    )
+                base_config = kwargs.pop('config', None)
+                kwargs['config'] = base_config.merge(timeout_config) if base_config else timeout_config
+                self._timed_s3_clients[step] = boto3.client('s3', **kwargs)
+        
+        return self._timed_s3_clients[step]
     
-    def set(self, key: str, value: str):
+    def set(self, key: str, value: str, timeout: float = None):
         """
         Redis SET equivalent: set a string value for a given string key.
         
         Note that if you want to store a JSON object, you need to serialize it
         to a string first.
         
+        If timeout (in seconds) is specified, a concurrent.futures.TimeoutError 
+        is raised if the op did not complete in time.
+        
         Ref: https://redis.io/commands/set/
         """
+        return self._run_before_deadline(self._set, key, value, deadline=self._get_deadline(timeout))
+    
+    def _set(self, key: str, value: str, deadline: float = None):
         assert isinstance(value, str), "Expected value to be a string, got {}".format(type(value))
         _key = self._get_object_key_from_key_name(key)
+        # add the key before writing it, so no reader can miss it once the write is done
+        self._bloom_add(key)
         try:
-            r = self._s3_client.put_object(
+            r = self._get_s3_client(deadline, fast_path=True).put_object(
                 Bucket=self.bucket_name,
                 Key=_key,
                 Body=value
@@ -137,21 +638,30 @@ class redis3Client():
                 print("!!! Failed operation: error code {}".format(e.response['Error']['Code']))
                 
             raise e
+        except (botocore.exceptions.ConnectTimeoutError, botocore.exceptions.ReadTimeoutError) as e:
+            raise concurrent.futures.TimeoutError("Timed out setting {}".format(_key)) from e
         # if put_object succeeded, return True    
         return True
     
-    def get(self, key: str):
+    def get(self, key: str, timeout: float = None):
         """
         Redis GET equivalent: get a string value for a given string key.
         
-        It returns None if the key doesn't exist.
+        It returns None if the key doesn't exist. If timeout (in seconds) is 
+        specified, a concurrent.futures.TimeoutError is raised if the op did 
+        not complete in time.
         
         Ref: https://redis.io/commands/get/
         
         """
+        return self._run_before_deadline(self._get, key, deadline=self._get_deadline(timeout))
+    
+    def _get(self, key: str, deadline: float = None):
+        if self._bloom_filter_enabled and not self._bloom_might_contain(key):
+            return None
         _key = self._get_object_key_from_key_name(key)
         try:
-            r = self._s3_client.get_object(
+            r = self._get_s3_client(deadline, fast_path=True).get_object(
                 Bucket=self.bucket_name,
                 Key=_key,
                 )
@@ -163,13 +673,82 @@ class redis3Client():
         except botocore.exceptions.ClientError as e:
             # this is where we handle the case where the key doesn't exist
             if e.response['Error']['Code'] == "NoSuchKey":
+                self._record_bloom_false_positive()
                 return None
             if self._verbose:
                 print("!!! Failed operation: error code {}".format(e.response['Error']['Code']))
                 
             raise e
+        except (botocore.exceptions.ConnectTimeoutError, botocore.exceptions.ReadTimeoutError) as e:
+            raise concurrent.futures.TimeoutError("Timed out getting {}".format(_key)) from e
+    
+    def _get_deadline(self, timeout: float = None):
+        """
+        Turn a timeout in seconds into an absolute deadline (None means no deadline).
+        """
+        return time() + timeout if timeout is not None else None
+    
+    def _run_before_deadline(self, func, *args, deadline: float = None):
+        """
+        Return func(*args, deadline=deadline). With a deadline, func runs in a thread
+        and a concurrent.futures.TimeoutError is raised as soon as the deadline expires
+        (the s3 client timeouts are rounded up, so they can't enforce it on their own).
+        """
+        if deadline is None:
+            return func(*args, deadline=deadline)
+        results, _ = self._run_concurrently(func, [args], deadline)
         
-    def mset(self, keys: list, values: list):
+        return results[0]
+    
+    def _run_concurrently(self, func, args_list: list, deadline: float = None, partial: bool = False):
+        """
+        Run func for each args in args_list in a thread pool, and return the list of
+        results and the list of statuses (STATUS_OK, STATUS_ERROR or STATUS_TIMEOUT), in 
+        the same order as args_list.
+        
+        When partial is False, the first error is raised as soon as it happens, and a
+        concurrent.futures.TimeoutError is raised if the deadline expires; when partial 
+        is True, nothing is raised and failed / timed out items have a None result.
+        In both cases, pending work is cancelled when we return.
+        """
+        results = [None] * len(args_list)
+        statuses = [STATUS_TIMEOUT] * len(args_list)
+        executor = concurrent.futures.ThreadPoolExecutor()
+        try:
+            futures = {}
+            for ctr, args in enumerate(args_list):
+                futures[executor.submit(func, *args, deadline=deadline)] = ctr
+            
+            remaining = deadline - time() if deadline is not None else None
+            done, _ = concurrent.futures.wait(
+                futures, 
+                timeout=max(remaining, 0) if remaining is not None else None,
+                return_when=concurrent.futures.ALL_COMPLETED if partial else concurrent.futures.FIRST_EXCEPTION
+                )
+            for future in done:
+                ctr = futures[future]
+                try:
+                    results[ctr] = future.result()
+                    statuses[ctr] = STATUS_OK
+                except concurrent.futures.TimeoutError as ex:
+                    if not partial:
+                        raise ex
+                except Exception as ex:
+                    if not partial:
+                        raise ex
+                    if self._verbose:
+                        print("!!! Failed operation: {}".format(ex))
+                    statuses[ctr] = STATUS_ERROR
+            
+            if not partial and len(done) < len(futures):
+                raise concurrent.futures.TimeoutError("Deadline expired with {} ops pending".format(len(futures) - len(done)))
+        finally:
+            # don't wait for stragglers: their own timeouts are derived from the same deadline
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        return results, statuses
+        
+    def mset(self, keys: list, values: list, timeout: float = None, partial: bool = False):
         """
         Set multiple keys to multiple values. 
         Note that it's a threaded execution of set() for each key, so the return value
@@ -178,25 +757,22 @@ class redis3Client():
         Note that this is not an atomic operation and there is now way to know
         which keys existed and which didn't.
         
+        If timeout (in seconds) is specified, pending ops are cancelled when it 
+        expires. If partial is True, no error is raised and a tuple (results, statuses) 
+        is returned, where statuses has STATUS_OK, STATUS_ERROR or STATUS_TIMEOUT for each key.
+        
         Ref: https://redis.io/commands/mset/
         """
+        results, statuses = self._run_concurrently(
+            self._set, 
+            list(zip(keys, values)), 
+            self._get_deadline(timeout), 
+            partial
+            )
                 
-        results = []
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = {}
-            for ctr, (k, v) in enumerate(zip(keys, values)):
-                futures[executor.submit(self.set, key=k, value=v)] = ctr
-            for future in concurrent.futures.as_completed(futures):
-                try:
-                    results.append((future.result(), futures[future]))
-                except Exception as ex:
-                    raise ex
-                
-        results, _ = zip(*sorted(results, key=lambda x: x[1]))
-                
-        return list(results)
+        return (results, statuses) if partial else results
         
-    def mget(self, keys: list):
+    def mget(self, keys: list, timeout: float = None, partial: bool = False):
         """
         Return the values associated with the specified keys.
         Note that it's a threaded execution of get() for each key, so the return value
@@ -205,24 +781,38 @@ class redis3Client():
         
         Note that this is not an atomic operation.
         
+        If timeout (in seconds) is specified, pending ops are cancelled when it 
+        expires. If partial is True, no error is raised and a tuple (values, statuses) 
+        is returned, where statuses has STATUS_OK, STATUS_MISSING, STATUS_ERROR or 
+        STATUS_TIMEOUT for each key (values are None for anything but STATUS_OK):
+        
+        values, statuses = my_client.mget(keys, timeout=0.05, partial=True)
+        
+        If the client was created with mget_processes and there are at least 
+        MGET_PROCESS_THRESHOLD keys (and no timeout / partial), the keys are fetched 
+        by a pool of worker processes instead of threads.
+        
         Ref: https://redis.io/commands/mget/
         """
-        values = []
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = {}
-            for ctr, k in enumerate(keys):
-                futures[executor.submit(self.get, key=k)] = ctr
-            for future in concurrent.futures.as_completed(futures):
-                try:
-                    values.append((future.result(), futures[future]))
-                except Exception as ex:
-                    raise ex
-                
-        values, _ = zip(*sorted(values, key=lambda x: x[1]))
+        if self._mget_processes and len(keys) >= MGET_PROCESS_THRESHOLD and timeout is None and not partial:
+            return self._mget_multiprocess(keys)
+        
+        values, statuses = self._run_concurrently(
+            self._get, 
+            [(k, ) for k in keys], 
+            self._get_deadline(timeout), 
+            partial
+            )
+        if partial:
+            statuses = [
+                STATUS_MISSING if s == STATUS_OK and v is None else s 
+                for v, s in zip(values, statuses)
+                ]
+            return values, statuses
                 
-        return list(values)
+        return values
     
-    def keys(self, starts_with=None):
+    def keys(self, starts_with=None, timeout: float = None):
         """
         Return all the keys matching the specified pattern in the current db, modeled
         after the Redis "KEYS pattern" command (usual caveat on atomicity 
@@ -233,6 +823,10 @@ class redis3Client():
         for key in my_client.keys():
             print(key)
         
+        If timeout (in seconds) is specified, a concurrent.futures.TimeoutError is 
+        raised when it expires before the listing is over (the timeout starts 
+        when keys is called, not when the iteration starts).
+        
         Ref: https://redis.io/commands/keys/
         """
         
@@ -240,10 +834,11 @@ class redis3Client():
             self.bucket_name, 
             # for express, only prefixes that end in a delimiter ( /) are supported.
             '{}/'.format(self.db), 
-            starts_with
+            starts_with,
+            self._get_deadline(timeout)
             )
 
-    def _get_matching_s3_keys(self, bucket, prefix, pattern):
+    def _get_matching_s3_keys(self, bucket, prefix, pattern, deadline=None):
         """
         Code gently inspired by: https://alexwlchan.net/2017/listing-s3-keys/
         """
@@ -251,13 +846,16 @@ class redis3Client():
         if prefix:
             kwargs['Prefix'] = prefix
         while True:
-            resp = self._s3_client.list_objects_v2(**kwargs)
-            for obj in resp['Contents']:
+            try:
+                resp = self._run_before_deadline(self._list_objects, dict(kwargs), deadline=deadline)
+            except (botocore.exceptions.ConnectTimeoutError, botocore.exceptions.ReadTimeoutError) as e:
+                raise concurrent.futures.TimeoutError("Timed out listing {}".format(prefix)) from e
+            for obj in resp.get('Contents', []):
                 key = obj['Key']
                 # we want to make sure keys start with the prefix (i.e. the db number)
                 assert key.startswith(prefix)
-                # if no pattern is specified or the key starts with the pattern
-                if pattern is None or key.startswith(pattern):
+                # if no pattern is specified or the key (without the db prefix) starts with the pattern
+                if pattern is None or key[len(prefix):].startswith(pattern):
                     yield key[len(prefix):]
 
             # The S3 API is paginated, so we pass the continuation token into the next response
@@ -266,6 +864,9 @@ class redis3Client():
             except KeyError:
                 break
             
+    def _list_objects(self, kwargs: dict, deadline: float = None):
+        return self._get_s3_client(deadline).list_objects_v2(**kwargs)
+    
     def delete(self, key: str):
         """
         Delete a key in the current database (a non-existent key gets ignored
@@ -275,9 +876,1276 @@ class redis3Client():
         Ref: https://redis.io/commands/del/
         """
         _key = self._get_object_key_from_key_name(key)
-        r = self._s3_client.delete_object(
+        r = self._get_s3_client(fast_path=True).delete_object(
+                Bucket=self.bucket_name,
+                Key=_key,
+                )
+            
+        return True
+
+    def exists(self, key: str):
+        """
+        Redis EXISTS equivalent (for a single key): return True if the key exists
+        in the current db, False otherwise (it's a HEAD request, so no value
+        gets transferred).
+        
+        Ref: https://redis.io/commands/exists/
+        """
+        return self._exists(key)
+    
+    def _exists(self, key: str, db: int = None):
+        if self._bloom_filter_enabled and not self._bloom_might_contain(key, db):
+            return False
+        _key = self._get_object_key_from_key_name(key, db)
+        try:
+            r = self._get_s3_client(fast_path=True).head_object(
+                Bucket=self.bucket_name,
+                Key=_key,
+                )
+        except botocore.exceptions.ClientError as e:
+            # HEAD has no body, so a missing key comes back as a bare 404
+            if e.response['Error']['Code'] in ("404", "NoSuchKey"):
+                self._record_bloom_false_positive(db)
+                return False
+            if self._verbose:
+                print("!!! Failed operation: error code {}".format(e.response['Error']['Code']))
+                
+            raise e
+        
+        return True
+
+    def set_stream(
+        self,
+        key: str,
+        data,
+        part_size: int = DEFAULT_PART_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+        ):
+        """
+        Set a (possibly large) value for a given string key, reading it from a
+        file-like object (anything with a read method), an iterable of 
+        bytes / str chunks, or a plain bytes / str value.
+        
+        Values that fit in a single part are stored with one put_object, larger
+        values are uploaded as a multipart upload, with up to max_concurrency
+        parts in flight at any time (so memory is bounded by 
+        part_size * max_concurrency, not by the size of the value).
+        
+        Note that the value is stored as raw bytes: use get_stream / get_into
+        to read it back.
+        """
+        assert part_size >= MIN_PART_SIZE, "Expected part_size to be at least {}, got {}".format(MIN_PART_SIZE, part_size)
+        assert max_concurrency >= 1, "Expected max_concurrency to be at least 1, got {}".format(max_concurrency)
+        _key = self._get_object_key_from_key_name(key)
+        self._bloom_add(key)
+        parts = self._iter_parts(data, part_size)
+        first_part = next(parts, b'')
+        second_part = next(parts, None)
+        # if everything fits in one part, skip the multipart dance
+        if second_part is None:
+            try:
+                r = self._s3_client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=_key,
+                    Body=first_part
+                    )
+            except botocore.exceptions.ClientError as e:
+                if self._verbose:
+                    print("!!! Failed operation: error code {}".format(e.response['Error']['Code']))
+                
+                raise e
+            
+            return True
+        
+        r = self._s3_client.create_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=_key,
+            )
+        upload_id = r['UploadId']
+        try:
+            completed_parts = []
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+                futures = set()
+                all_parts = itertools.chain([first_part, second_part], parts)
+                for part_number, body in enumerate(all_parts, start=1):
+                    # wait for a slot before reading the next part, to bound memory
+                    if len(futures) >= max_concurrency:
+                        done, futures = concurrent.futures.wait(
+                            futures, 
+                            return_when=concurrent.futures.FIRST_COMPLETED
+                            )
+                        completed_parts.extend(f.result() for f in done)
+                    futures.add(executor.submit(self._upload_part, _key, upload_id, part_number, body))
+                completed_parts.extend(f.result() for f in concurrent.futures.as_completed(futures))
+            
+            self._s3_client.complete_multipart_upload(
                 Bucket=self.bucket_name,
                 Key=_key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': sorted(completed_parts, key=lambda x: x['PartNumber'])}
                 )
+        except Exception as e:
+            # don't leave orphan parts around (they are billed as storage)
+            if self._verbose:
+                print("!!! Aborting multipart upload {} for {}".format(upload_id, _key))
+            self._s3_client.abort_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=_key,
+                UploadId=upload_id
+                )
+            raise e
+        
+        if self._verbose:
+            print("Uploaded {} parts for {}".format(len(completed_parts), _key))
+        
+        return True
+    
+    def _upload_part(self, object_key: str, upload_id: str, part_number: int, body: bytes):
+        """
+        Upload a single part of a multipart upload and return the part info
+        needed to complete it.
+        """
+        r = self._s3_client.upload_part(
+            Bucket=self.bucket_name,
+            Key=object_key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=body
+            )
+        
+        return {'PartNumber': part_number, 'ETag': r['ETag']}
+    
+    def _iter_parts(self, data, part_size: int):
+        """
+        Re-chunk whatever the user gave us (a file-like object, an iterable of chunks
+        or a single value) into bytes parts of exactly part_size (the last one can be smaller).
+        """
+        if isinstance(data, (bytes, bytearray, str)):
+            chunks = [data]
+        elif hasattr(data, 'read'):
+            chunks = iter(lambda: data.read(part_size), data.read(0))
+        else:
+            chunks = data
+        
+        buffer = bytearray()
+        for chunk in chunks:
+            buffer += chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+            while len(buffer) >= part_size:
+                yield bytes(buffer[:part_size])
+                del buffer[:part_size]
+        if buffer:
+            yield bytes(buffer)
+    
+    def get_stream(
+        self,
+        key: str,
+        part_size: int = DEFAULT_PART_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+        ):
+        """
+        Get a (possibly large) value for a given string key as an iterator
+        of bytes chunks, in order.
+        
+        It returns None if the key doesn't exist. Objects larger than part_size
+        are fetched with concurrent ranged GETs, keeping at most max_concurrency
+        parts in memory at any time.
+        
+        for chunk in my_client.get_stream('my_big_key'):
+            f.write(chunk)
+        """
+        _key = self._get_object_key_from_key_name(key)
+        try:
+            r = self._s3_client.head_object(
+                Bucket=self.bucket_name,
+                Key=_key,
+                )
+        except botocore.exceptions.ClientError as e:
+            # HEAD has no body, so a missing key comes back as a bare 404
+            if e.response['Error']['Code'] in ("404", "NoSuchKey"):
+                return None
+            if self._verbose:
+                print("!!! Failed operation: error code {}".format(e.response['Error']['Code']))
+                
+            raise e
+        
+        return self._iter_ranges(_key, r['ContentLength'], r['ETag'], part_size, max_concurrency)
+    
+    def _iter_ranges(self, object_key: str, size: int, etag: str, part_size: int, max_concurrency: int):
+        """
+        Yield the object content in order, by keeping a sliding window of 
+        max_concurrency ranged GETs in flight.
+        """
+        ranges = [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            window = collections.deque()
+            for byte_range in ranges:
+                window.append(executor.submit(self._get_range, object_key, byte_range, etag))
+                if len(window) >= max_concurrency:
+                    yield window.popleft().result()
+            while window:
+                yield window.popleft().result()
+    
+    def _get_range(self, object_key: str, byte_range: tuple, etag: str):
+        """
+        Get a byte range of an object: IfMatch makes sure all the ranges 
+        come from the same version of the object (i.e. if the key gets 
+        overwritten while we read it, we fail instead of returning a mix).
+        """
+        r = self._s3_client.get_object(
+            Bucket=self.bucket_name,
+            Key=object_key,
+            Range='bytes={}-{}'.format(*byte_range),
+            IfMatch=etag
+            )
+        
+        return r['Body'].read()
+    
+    def get_into(
+        self,
+        key: str,
+        file,
+        part_size: int = DEFAULT_PART_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+        ):
+        """
+        Get a (possibly large) value for a given string key and write it into a
+        file-like object (anything with a write method) or a pre-allocated
+        writable buffer (e.g. a bytearray), see get_stream for the details.
+        
+        It returns the number of bytes written, or None if the key doesn't exist.
+        """
+        chunks = self.get_stream(key, part_size=part_size, max_concurrency=max_concurrency)
+        if chunks is None:
+            return None
+        
+        view = None if hasattr(file, 'write') else memoryview(file)
+        written = 0
+        for chunk in chunks:
+            if view is None:
+                file.write(chunk)
+            else:
+                view[written:written + len(chunk)] = chunk
+            written += len(chunk)
             
+        return written
+    
+    @property
+    def bloom_stats(self):
+        """
+        Return the counters of the negative-lookup filter: lookups (keys checked
+        against a filter), avoided (s3 requests skipped because the key is surely
+        not there), false_positives (the filter said maybe, s3 said no), rebuilds 
+        and syncs (with the persisted filter).
+        """
+        with self._bloom_lock:
+            return {k: self._bloom_stats[k] for k in ('lookups', 'avoided', 'false_positives', 'rebuilds', 'syncs')}
+    
+    def _get_bloom_filter_key(self, db: int):
+        return '{}{}'.format(BLOOM_FILTER_PREFIX, db)
+    
+    def _bloom_might_contain(self, key: str, db: int = None):
+        """
+        Return False only if the filter for the current db says the key is not there.
+        
+        Filters are loaded (or built from a full listing of the db, if there is none
+        or it's too old) in a background thread the first time a db is used, and
+        rebuilt every bloom_rebuild_interval seconds or when they get too full: until
+        the filter is ready, every lookup goes to s3. In between, each client syncs its
+        filter with the persisted one every bloom_sync_interval seconds (see 
+        _sync_bloom_filter).
+        
+        Note that this means false misses, i.e. gets returning None for keys that 
+        exist: for up to about twice bloom_sync_interval for keys written by other 
+        clients with bloom_filter=True, and until the next rebuild for keys written 
+        in any other way (a client without the filter, another tool, or a client 
+        with the filter that stopped before syncing). Only turn the filter on if
+        you can live with that.
+        """
+        db = self.db if db is None else db
+        bloom_filter = self._bloom_filters.get(db)
+        if bloom_filter is None or bloom_filter.is_full() or self._is_bloom_filter_stale(bloom_filter):
+            self._start_bloom_filter_rebuild(db)
+        if bloom_filter is None:
+            return True
+        if time() - self._bloom_synced_at.get(db, 0) > self._bloom_sync_interval:
+            self._start_bloom_filter_sync(db)
+        
+        might_contain = key in bloom_filter
+        with self._bloom_lock:
+            self._bloom_stats['lookups'] += 1
+            if not might_contain:
+                self._bloom_stats['avoided'] += 1
+        
+        return might_contain
+    
+    def _bloom_add(self, key: str, db: int = None):
+        if not self._bloom_filter_enabled:
+            return
+        
+        db = self.db if db is None else db
+        with self._bloom_lock:
+            bloom_filter = self._bloom_filters.get(db)
+            if bloom_filter is not None:
+                bloom_filter.add(key)
+                self._bloom_unsynced.setdefault(db, set()).add(key)
+            # if a filter is being built, make sure it gets the key too
+            pending_keys = self._bloom_building.get(db)
+            if pending_keys is not None:
+                pending_keys.add(key)
+        # writes are batched: the filter is persisted at most once per sync interval
+        if bloom_filter is not None:
+            self._start_bloom_filter_sync(db, delay=self._bloom_sync_interval)
+        elif pending_keys is None:
+            # no filter yet (e.g. a write before the first read): the persisted one
+            # we'll load doesn't know about this key, so keep it for when it's ready
+            self._start_bloom_filter_rebuild(db, pending_keys=[key])
+    
+    def _record_bloom_false_positive(self, db: int = None):
+        if self._bloom_filter_enabled and (self.db if db is None else db) in self._bloom_filters:
+            with self._bloom_lock:
+                self._bloom_stats['false_positives'] += 1
+    
+    def _is_bloom_filter_stale(self, bloom_filter: BloomFilter):
+        return time() - bloom_filter.built_at > self._bloom_rebuild_interval
+    
+    def _start_bloom_filter_rebuild(self, db: int, pending_keys: list = ()):
+        with self._bloom_lock:
+            self._bloom_building.setdefault(db, set()).update(pending_keys)
+            # only one (re)build per db at a time
+            if db in self._bloom_rebuilding:
+                return
+            self._bloom_rebuilding.add(db)
+        
+        threading.Thread(target=self._rebuild_bloom_filter, args=(db, ), daemon=True).start()
+    
+    def _rebuild_bloom_filter(self, db: int):
+        """
+        Use the persisted filter if we don't have one yet and it's fresh enough,
+        build a new one otherwise. Runs in a background thread.
+        """
+        try:
+            if db not in self._bloom_filters:
+                bloom_filter, etag = self._load_bloom_filter(db)
+                if bloom_filter is not None and not bloom_filter.is_full() and not self._is_bloom_filter_stale(bloom_filter):
+                    self._swap_bloom_filter(db, bloom_filter, etag)
+                    return
+            
+            self._build_bloom_filter(db)
+        except Exception as ex:
+            # we'll try again at the next lookup (keeping the pending keys), and in the
+            # meantime all lookups go to s3
+            if self._verbose:
+                print("!!! Failed to build bloom filter for db {}: {}".format(db, ex))
+        finally:
+            with self._bloom_lock:
+                self._bloom_rebuilding.discard(db)
+    
+    def _build_bloom_filter(self, db: int, capacity: int = None):
+        """
+        Build a filter for db from a full listing, persist it and start using it.
+        """
+        with self._bloom_lock:
+            self._bloom_building.setdefault(db, set())
+        
+        keys = list(self._get_matching_s3_keys(self.bucket_name, '{}/'.format(db), None))
+        # leave room for new keys, so that we don't need to rebuild too soon
+        bloom_filter = BloomFilter(
+            capacity or max(2 * len(keys), MIN_BLOOM_CAPACITY),
+            self._bloom_error_rate
+            )
+        for k in keys:
+            bloom_filter.add(k)
+        # keys synced by other clients while we were listing can be missing from the new
+        # filter (if it has a different shape than the persisted one) until the next rebuild
+        self._swap_bloom_filter(db, bloom_filter)
+        self._sync_bloom_filter(db, save=True)
+        with self._bloom_lock:
+            self._bloom_stats['rebuilds'] += 1
+        if self._verbose:
+            print("Built bloom filter for db {} with {} keys".format(db, len(keys)))
+        
+        return bloom_filter
+    
+    def _swap_bloom_filter(self, db: int, bloom_filter: BloomFilter, etag: str = None):
+        # add the keys written while the filter was being built, and start using it
+        with self._bloom_lock:
+            pending_keys = self._bloom_building.pop(db, set())
+            for k in pending_keys:
+                bloom_filter.add(k)
+            self._bloom_unsynced.setdefault(db, set()).update(pending_keys)
+            self._bloom_filters[db] = bloom_filter
+            self._bloom_etags[db] = etag
+            self._bloom_synced_at[db] = time()
+    
+    def _start_bloom_filter_sync(self, db: int, delay: float = 0):
+        with self._bloom_lock:
+            # only one sync per db running or scheduled at a time
+            if db in self._bloom_syncing:
+                return
+            self._bloom_syncing.add(db)
+        
+        timer = threading.Timer(delay, self._run_bloom_filter_sync, args=(db, ))
+        timer.daemon = True
+        timer.start()
+    
+    def _run_bloom_filter_sync(self, db: int):
+        try:
+            self._sync_bloom_filter(db)
+        except Exception as ex:
+            # the unsynced keys are kept, and we'll try again at the next lookup or write
+            if self._verbose:
+                print("!!! Failed to sync bloom filter for db {}: {}".format(db, ex))
+        finally:
+            with self._bloom_lock:
+                self._bloom_syncing.discard(db)
+                pending = bool(self._bloom_unsynced.get(db))
+            # keys added while we were syncing get their own (debounced) sync
+            if pending:
+                self._start_bloom_filter_sync(db, delay=self._bloom_sync_interval)
+    
+    def _sync_bloom_filter(self, db: int, save: bool = False):
+        """
+        Merge the persisted filter for db into ours, so that we see the keys written by 
+        the other clients, and persist the result if we added keys since the last sync 
+        (or if save is True), so that they see ours.
+        
+        Writes are conditional on the ETag of the filter we merged, so that concurrent 
+        syncs don't drop each other's keys: if another client got there first, we merge 
+        again. If the persisted filter has a different shape (i.e. one of the two was 
+        rebuilt with a different capacity), the most recently built one wins, plus the
+        keys we added since the last sync.
+        """
+        with self._bloom_lock:
+            unsynced = self._bloom_unsynced.pop(db, set())
+        try:
+            for _ in range(BLOOM_SYNC_MAX_RETRIES):
+                with self._bloom_lock:
+                    etag = self._bloom_etags.get(db)
+                # nothing to write: only download the persisted filter if it changed
+                persisted, new_etag = self._load_bloom_filter(db, if_none_match=etag if not (unsynced or save) else None)
+                with self._bloom_lock:
+                    bloom_filter = self._bloom_filters[db]
+                    if persisted is not None:
+                        if bloom_filter.has_same_shape(persisted):
+                            bloom_filter.merge(persisted)
+                        elif persisted.built_at > bloom_filter.built_at:
+                            for k in unsynced:
+                                persisted.add(k)
+                            bloom_filter = persisted
+                            self._bloom_filters[db] = bloom_filter
+                    if new_etag is not None:
+                        self._bloom_etags[db] = new_etag
+                    data = bloom_filter.to_bytes() if unsynced or save else None
+                if data is not None:
+                    new_etag = self._put_bloom_filter(db, data, new_etag)
+                    if new_etag is None:
+                        continue
+                    with self._bloom_lock:
+                        self._bloom_etags[db] = new_etag
+                with self._bloom_lock:
+                    self._bloom_synced_at[db] = time()
+                    self._bloom_stats['syncs'] += 1
+                return True
+            
+            raise Exception("Bloom filter for db {} kept changing, sync aborted".format(db))
+        except Exception as ex:
+            with self._bloom_lock:
+                self._bloom_unsynced.setdefault(db, set()).update(unsynced)
+            raise ex
+    
+    def _put_bloom_filter(self, db: int, data: bytes, etag: str = None):
+        """
+        Persist a filter if the current one has the given ETag (or if there is none, when 
+        etag is None), and return the new ETag, or None if the condition failed.
+        """
+        condition = {'IfMatch': etag} if etag is not None else {'IfNoneMatch': '*'}
+        try:
+            r = self._s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=self._get_bloom_filter_key(db),
+                Body=data,
+                **condition
+                )
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ("PreconditionFailed", "ConditionalRequestConflict"):
+                return None
+            raise e
+        
+        return r['ETag']
+    
+    def _load_bloom_filter(self, db: int, if_none_match: str = None):
+        """
+        Return the persisted filter for db and its ETag, (None, None) if there is none,
+        or (None, if_none_match) if it has that ETag, i.e. it didn't change.
+        """
+        condition = {'IfNoneMatch': if_none_match} if if_none_match is not None else {}
+        try:
+            r = self._s3_client.get_object(
+                Bucket=self.bucket_name,
+                Key=self._get_bloom_filter_key(db),
+                **condition
+                )
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] == "NoSuchKey":
+                return None, None
+            if e.response['Error']['Code'] in ("304", "NotModified"):
+                return None, if_none_match
+            raise e
+        
+        return BloomFilter.from_bytes(r['Body'].read()), r['ETag']
+    
+    def build_bloom_filter(self, capacity: int = None):
+        """
+        Build the negative-lookup filter for the current db from a full listing of
+        its keys (sized for capacity keys, default to twice the current ones), 
+        persist it as an object and start using it. It returns the number of keys 
+        in the filter.
+        
+        You don't need to call this if bloom_filter=True, as filters are built and 
+        rebuilt in the background, but it's handy to warm a db up in a known state.
+        """
+        bloom_filter = self._build_bloom_filter(self.db, capacity)
+        self._bloom_filter_enabled = True
+        
+        return bloom_filter.count
+    
+    def save_bloom_filter(self):
+        """
+        Merge the filter for the current db with the persisted one and save it now,
+        including the keys written through this client since the last sync (e.g. 
+        before shutting down a long-running process, as syncs run in the background).
+        
+        It returns False if there is no filter to save.
+        """
+        if self.db not in self._bloom_filters:
+            return False
+        
+        return self._sync_bloom_filter(self.db, save=True)
+    
+    def dump_db(
+        self,
+        target: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_concurrency: int = DEFAULT_BULK_CONCURRENCY,
+        progress: bool = None
+        ):
+        """
+        Dump all the keys and values of the current db into an archive at target, which
+        is either a local directory or an s3 location like s3://my-bucket/my/prefix.
+        
+        The archive is a manifest.json plus chunks of chunk_size keys each (zlib compressed
+        records of raw bytes, so values stored with set_stream are fine too): the values of 
+        a chunk are read with max_concurrency concurrent GETs. Note that, as for keys(), this 
+        is not a point in time snapshot: keys written during the dump may or may not be in it.
+        
+        If progress is True (default to the client verbose setting), the throughput so far
+        is printed after each chunk.
+        
+        It returns a dict with the number of keys, bytes (of values), chunks and seconds.
+        """
+        start_time = time()
+        progress = self._verbose if progress is None else progress
+        archive_id = str(uuid.uuid4())
+        chunks = []
+        stats = {'keys': 0, 'bytes': 0, 'chunks': 0, 'seconds': 0.0}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            keys = self.keys()
+            while True:
+                chunk_keys = list(itertools.islice(keys, chunk_size))
+                if not chunk_keys:
+                    break
+                values = list(executor.map(self._get_bytes, chunk_keys))
+                records = [(k, v) for k, v in zip(chunk_keys, values) if v is not None]
+                chunk_name = 'chunk_{:06d}'.format(len(chunks))
+                self._write_archive_object(target, chunk_name, self._encode_archive_chunk(records))
+                chunks.append({'name': chunk_name, 'keys': len(records)})
+                stats['keys'] += len(records)
+                stats['bytes'] += sum(len(v) for _, v in records)
+                stats['chunks'] += 1
+                stats['seconds'] = time() - start_time
+                if progress:
+                    self._print_bulk_progress('Dumped', stats)
+        
+        # the manifest goes last: an archive without it is incomplete
+        manifest = {
+            'archive_id': archive_id,
+            'db': self.db,
+            'created_at': start_time,
+            'keys': stats['keys'],
+            'chunks': chunks,
+            }
+        self._write_archive_object(target, ARCHIVE_MANIFEST, json.dumps(manifest).encode('utf-8'))
+        stats['seconds'] = time() - start_time
+        
+        return stats
+    
+    def restore_db(
+        self,
+        source: str,
+        skip_existing: bool = False,
+        max_concurrency: int = DEFAULT_BULK_CONCURRENCY,
+        progress: bool = None
+        ):
+        """
+        Load an archive produced by dump_db (a local directory or an s3 location like 
+        s3://my-bucket/my/prefix) into the current db, with max_concurrency concurrent 
+        writes. If skip_existing is True, keys already in the db are not overwritten.
+        
+        Completed chunks are checkpointed in the cache bucket, so if a restore fails, 
+        calling restore_db again with the same source resumes from the first chunk that 
+        was not completed (the checkpoint is removed when the restore succeeds). As in
+        dump_db, progress is printed after each chunk if progress is True (default to verbose).
+        
+        It returns a dict with the number of keys written, keys skipped, bytes (of values), 
+        chunks and seconds.
+        """
+        start_time = time()
+        progress = self._verbose if progress is None else progress
+        manifest = json.loads(self._read_archive_object(source, ARCHIVE_MANIFEST))
+        checkpoint_key = '{}{}/{}'.format(RESTORE_CHECKPOINT_PREFIX, self.db, manifest['archive_id'])
+        done_chunks = set(self._load_restore_checkpoint(checkpoint_key))
+        if done_chunks and self._verbose:
+            print("Resuming restore of {}: {} chunks already done".format(source, len(done_chunks)))
+        
+        stats = {'keys': 0, 'skipped': 0, 'bytes': 0, 'chunks': 0, 'seconds': 0.0}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            for chunk in manifest['chunks']:
+                if chunk['name'] in done_chunks:
+                    continue
+                records = self._decode_archive_chunk(self._read_archive_object(source, chunk['name']))
+                written = list(executor.map(lambda r: self._set_bytes(*r, skip_existing=skip_existing), records))
+                done_chunks.add(chunk['name'])
+                self._s3_client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=checkpoint_key,
+                    Body=json.dumps(sorted(done_chunks))
+                    )
+                stats['keys'] += sum(written)
+                stats['skipped'] += len(written) - sum(written)
+                stats['bytes'] += sum(len(v) for (_, v), w in zip(records, written) if w)
+                stats['chunks'] += 1
+                stats['seconds'] = time() - start_time
+                if progress:
+                    self._print_bulk_progress('Restored', stats)
+        
+        self._s3_client.delete_object(Bucket=self.bucket_name, Key=checkpoint_key)
+        stats['seconds'] = time() - start_time
+        
+        return stats
+    
+    def _print_bulk_progress(self, verb: str, stats: dict):
+        elapsed = max(stats['seconds'], 1e-6)
+        print("{} {} keys ({:.2f} MB) in {} chunks, {:.1f}s: {:.0f} keys/s, {:.2f} MB/s".format(
+            verb, stats['keys'], stats['bytes'] / 1024 ** 2, stats['chunks'], elapsed,
+            stats['keys'] / elapsed, stats['bytes'] / 1024 ** 2 / elapsed))
+    
+    def _get_bytes(self, key: str):
+        """
+        Get the raw value of a key as bytes (None if the key doesn't exist).
+        """
+        try:
+            r = self._get_s3_client(fast_path=True).get_object(
+                Bucket=self.bucket_name,
+                Key=self._get_object_key_from_key_name(key),
+                )
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] == "NoSuchKey":
+                return None
+            raise e
+        
+        return r['Body'].read()
+    
+    def _set_bytes(self, key: str, value: bytes, skip_existing: bool = False):
+        """
+        Set the raw value of a key, returning False if it was skipped because it exists.
+        """
+        # a conditional put, so that a key written in the meantime is never overwritten
+        condition = {'IfNoneMatch': '*'} if skip_existing else {}
+        self._bloom_add(key)
+        try:
+            self._get_s3_client(fast_path=True).put_object(
+                Bucket=self.bucket_name,
+                Key=self._get_object_key_from_key_name(key),
+                Body=value,
+                **condition
+                )
+        except botocore.exceptions.ClientError as e:
+            if skip_existing and e.response['Error']['Code'] in ("PreconditionFailed", "ConditionalRequestConflict"):
+                return False
+            raise e
+        
+        return True
+    
+    def _load_restore_checkpoint(self, checkpoint_key: str):
+        try:
+            r = self._s3_client.get_object(Bucket=self.bucket_name, Key=checkpoint_key)
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] == "NoSuchKey":
+                return []
+            raise e
+        
+        return json.loads(r['Body'].read())
+    
+    def _encode_archive_chunk(self, records: list):
+        parts = []
+        for k, v in records:
+            k = k.encode('utf-8')
+            parts.append(ARCHIVE_RECORD_HEADER.pack(len(k), len(v)))
+            parts.append(k)
+            parts.append(v)
+        
+        return zlib.compress(b''.join(parts))
+    
+    def _decode_archive_chunk(self, data: bytes):
+        data = zlib.decompress(data)
+        records = []
+        pos = 0
+        while pos < len(data):
+            key_len, value_len = ARCHIVE_RECORD_HEADER.unpack_from(data, pos)
+            pos += ARCHIVE_RECORD_HEADER.size
+            key = data[pos:pos + key_len].decode('utf-8')
+            pos += key_len
+            records.append((key, data[pos:pos + value_len]))
+            pos += value_len
+        
+        return records
+    
+    def _split_s3_location(self, location: str):
+        """
+        Split s3://bucket/some/prefix into (bucket, 'some/prefix/'), or return None
+        if location is a local path.
+        """
+        if not location.startswith('s3://'):
+            return None
+        bucket, _, prefix = location[len('s3://'):].partition('/')
+        
+        return bucket, prefix.rstrip('/') + '/' if prefix else ''
+    
+    def _write_archive_object(self, location: str, name: str, data: bytes):
+        s3_location = self._split_s3_location(location)
+        if s3_location is None:
+            os.makedirs(location, exist_ok=True)
+            with open(os.path.join(location, name), 'wb') as f:
+                f.write(data)
+            return
+        
+        bucket, prefix = s3_location
+        self._s3_client.put_object(Bucket=bucket, Key=prefix + name, Body=data)
+    
+    def _read_archive_object(self, location: str, name: str):
+        s3_location = self._split_s3_location(location)
+        if s3_location is None:
+            with open(os.path.join(location, name), 'rb') as f:
+                return f.read()
+        
+        bucket, prefix = s3_location
+        r = self._s3_client.get_object(Bucket=bucket, Key=prefix + name)
+        return r['Body'].read()
+    
+    def copy(self, src: str, dst: str, db: int = None, replace: bool = False):
+        """
+        Redis COPY equivalent: copy the value of src to dst, in db (default to the
+        current db). The copy happens server-side in s3 (copy_object), so no value
+        bytes go through the client.
+        
+        It returns False if src doesn't exist, or if dst exists and replace is False
+        (note that checking dst costs one more request, and it's not atomic).
+        Values larger than 5GB can't be copied in a single copy_object.
+        
+        Ref: https://redis.io/commands/copy/
+        """
+        db = self.db if db is None else db
+        if src == dst and db == self.db:
+            # s3 can't copy an object onto itself, and there is nothing to copy anyway
+            return replace and self._exists(src)
+        if not replace and self._exists(dst, db):
+            return False
+        # add dst to the filter before copying, as in set
+        self._bloom_add(dst, db)
+        try:
+            r = self._s3_client.copy_object(
+                Bucket=self.bucket_name,
+                Key=self._get_object_key_from_key_name(dst, db),
+                CopySource={
+                    'Bucket': self.bucket_name,
+                    'Key': self._get_object_key_from_key_name(src)
+                    }
+                )
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ("NoSuchKey", "404"):
+                return False
+            if self._verbose:
+                print("!!! Failed operation: error code {}".format(e.response['Error']['Code']))
+                
+            raise e
+        
+        return True
+    
+    def rename(self, src: str, dst: str):
+        """
+        Redis RENAME equivalent: rename src to dst in the current db, overwriting dst
+        if it exists. It's a server-side copy followed by a delete of src, so it's
+        not atomic (if the delete fails, you end up with both keys).
+        
+        It returns False if src doesn't exist (where Redis would return an error).
+        
+        Ref: https://redis.io/commands/rename/
+        """
+        if src == dst:
+            # nothing to do, as long as the key is there
+            return self._exists(src)
+        if not self.copy(src, dst, replace=True):
+            return False
+        
+        return self.delete(src)
+    
+    def move(self, key: str, db: int, replace: bool = False):
+        """
+        Redis MOVE equivalent: move key from the current db to db (server-side copy, 
+        then delete). It returns False if key doesn't exist, if db is the current db,
+        or if key already exists in db and replace is False (as in Redis).
+        
+        Ref: https://redis.io/commands/move/
+        """
+        if int(db) == self.db:
+            return False
+        if not self.copy(key, key, db=int(db), replace=replace):
+            return False
+        
+        return self.delete(key)
+    
+    def _run_bulk(self, func, args_list: list, max_concurrency: int):
+        """
+        Run func for each args in args_list with max_concurrency threads, and 
+        return the results in order (the first error is raised).
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            return list(executor.map(lambda args: func(*args), args_list))
+    
+    def mcopy(self, srcs: list, dsts: list, db: int = None, replace: bool = False, max_concurrency: int = DEFAULT_BULK_CONCURRENCY):
+        """
+        Run copy concurrently for each (src, dst) pair, returning the list of results.
+        """
+        return self._run_bulk(self.copy, [(s, d, db, replace) for s, d in zip(srcs, dsts)], max_concurrency)
+    
+    def mrename(self, srcs: list, dsts: list, max_concurrency: int = DEFAULT_BULK_CONCURRENCY):
+        """
+        Run rename concurrently for each (src, dst) pair, returning the list of results.
+        """
+        return self._run_bulk(self.rename, list(zip(srcs, dsts)), max_concurrency)
+    
+    def mmove(self, keys: list, db: int, replace: bool = False, max_concurrency: int = DEFAULT_BULK_CONCURRENCY):
+        """
+        Run move concurrently for each key, returning the list of results.
+        """
+        return self._run_bulk(self.move, [(k, db, replace) for k in keys], max_concurrency)
+    
+    def move_db(
+        self,
+        db: int,
+        starts_with: str = None,
+        replace: bool = False,
+        max_concurrency: int = DEFAULT_BULK_CONCURRENCY
+        ):
+        """
+        Move all the keys of the current db (or only the ones starting with starts_with)
+        to db, DEFAULT_CHUNK_SIZE keys at a time, each chunk with max_concurrency 
+        concurrent moves. It returns the number of keys moved.
+        
+        Note that keys written while the move is running may or may not be moved.
+        """
+        moved = 0
+        keys = self.keys(starts_with=starts_with)
+        while True:
+            chunk_keys = list(itertools.islice(keys, DEFAULT_CHUNK_SIZE))
+            if not chunk_keys:
+                break
+            moved += sum(self.mmove(chunk_keys, db, replace=replace, max_concurrency=max_concurrency))
+            if self._verbose:
+                print("Moved {} keys from db {} to db {}".format(moved, self.db, db))
+        
+        return moved
+    
+    def _get_list_prefix(self, key: str):
+        # quote the key, so that a list key can't be a prefix of another list's objects
+        return '{}{}/{}/'.format(LIST_PREFIX, self.db, urllib.parse.quote(key, safe=''))
+    
+    def _load_list_meta(self, key: str):
+        """
+        Return the (metadata, ETag) of a list, or an empty metadata and None
+        if the list doesn't exist.
+        """
+        try:
+            r = self._s3_client.get_object(
+                Bucket=self.bucket_name,
+                Key=self._get_list_prefix(key) + 'meta',
+                )
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] == "NoSuchKey":
+                return {'chunks': [], 'length': 0, 'mergeable_chunks': 0}, None
+            raise e
+        
+        return json.loads(r['Body'].read()), r['ETag']
+    
+    def _save_list_meta(self, key: str, meta: dict, etag: str):
+        """
+        Conditionally write the metadata of a list: it succeeds only if nobody wrote it 
+        since we read the version with etag (or, if etag is None, if it doesn't exist yet).
+        It returns the new ETag, or None if the condition failed.
+        """
+        condition = {'IfMatch': etag} if etag is not None else {'IfNoneMatch': '*'}
+        try:
+            r = self._s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=self._get_list_prefix(key) + 'meta',
+                Body=json.dumps(meta),
+                **condition
+                )
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ("PreconditionFailed", "ConditionalRequestConflict"):
+                return None
+            raise e
+        
+        return r['ETag']
+    
+    def _update_list_meta(self, key: str, update):
+        """
+        Apply update (a function from the current metadata to the new one, or None to leave
+        it as is) with optimistic concurrency: start from the last version we know of, and 
+        reload and retry when somebody else wrote in the meantime. It returns the new metadata.
+        """
+        cache_key = (self.db, key)
+        with self._list_lock:
+            meta, etag = self._list_meta_cache.get(cache_key, (None, None))
+        if meta is None:
+            meta, etag = self._load_list_meta(key)
+        for attempt in range(LIST_MAX_RETRIES):
+            new_meta = update(copy.deepcopy(meta))
+            if new_meta is None:
+                return meta
+            new_etag = self._save_list_meta(key, new_meta, etag)
+            if new_etag is not None:
+                with self._list_lock:
+                    self._list_meta_cache[cache_key] = (new_meta, new_etag)
+                return new_meta
+            # somebody else won: back off a bit, so that we don't all retry in lockstep
+            sleep(random.uniform(0, min(LIST_RETRY_BACKOFF * 2 ** attempt, LIST_RETRY_MAX_BACKOFF)))
+            meta, etag = self._load_list_meta(key)
+        
+        raise RuntimeError("Too many concurrent writes to list {}, giving up".format(key))
+    
+    def _write_list_chunk(self, key: str, values: list):
+        chunk_id = uuid.uuid4().hex
+        self._s3_client.put_object(
+            Bucket=self.bucket_name,
+            Key=self._get_list_prefix(key) + chunk_id,
+            Body=json.dumps(values)
+            )
+        
+        return chunk_id
+    
+    def _read_list_chunk(self, key: str, chunk_id: str):
+        r = self._s3_client.get_object(
+            Bucket=self.bucket_name,
+            Key=self._get_list_prefix(key) + chunk_id,
+            )
+        
+        return json.loads(r['Body'].read())
+    
+    def _push(self, key: str, values: list, head: bool):
+        assert all(isinstance(v, str) for v in values), "Expected values to be strings"
+        if not values:
+            raise ValueError("Expected at least one value to push")
+        # the chunk is written once, only the (small) metadata is retried on conflicts
+        chunk_id = self._write_list_chunk(key, values)
+        
+        def _add_chunk(meta):
+            if head:
+                meta['chunks'].insert(0, [chunk_id, len(values)])
+            else:
+                meta['chunks'].append([chunk_id, len(values)])
+            meta['length'] += len(values)
+            meta['mergeable_chunks'] = self._count_mergeable_chunks(meta['chunks'])
+            return meta
+        
+        try:
+            meta = self._update_list_meta(key, _add_chunk)
+        except RuntimeError as e:
+            # we gave up, so the chunk is not in the list: don't leave it behind (on other 
+            # errors we can't tell if the metadata was written, so the chunk stays)
+            self._s3_client.delete_object(
+                Bucket=self.bucket_name,
+                Key=self._get_list_prefix(key) + chunk_id
+                )
+            raise e
+        # full chunks don't count: compacting them would not remove anything
+        if meta['mergeable_chunks'] > LIST_COMPACTION_THRESHOLD:
+            self._start_list_compaction(key)
+        
+        return meta['length']
+    
+    def rpush(self, key: str, *values):
+        """
+        Redis RPUSH equivalent: append values at the tail of the list at key (created 
+        if it doesn't exist), and return the length of the list.
+        
+        Values are stored as a new immutable chunk object, and the list metadata object 
+        is updated with a conditional write (retried if somebody else updated it first), 
+        so the cost of a push doesn't depend on the length of the list.
+        
+        Note that lists live in their own namespace: keys(), get() and delete() don't 
+        see them.
+        
+        Ref: https://redis.io/commands/rpush/
+        """
+        return self._push(key, list(values), head=False)
+    
+    def lpush(self, key: str, *values):
+        """
+        Redis LPUSH equivalent: insert values at the head of the list at key, one after
+        the other (so lpush('l', 'a', 'b') results in ['b', 'a']), and return the length 
+        of the list. See rpush for the details.
+        
+        Ref: https://redis.io/commands/lpush/
+        """
+        return self._push(key, list(reversed(values)), head=True)
+    
+    def llen(self, key: str):
+        """
+        Redis LLEN equivalent: return the length of the list at key (0 if it doesn't exist).
+        
+        Ref: https://redis.io/commands/llen/
+        """
+        meta, _ = self._load_list_meta(key)
+        return meta['length']
+    
+    def lrange(self, key: str, start: int, stop: int, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        """
+        Redis LRANGE equivalent: return the elements of the list at key from start to 
+        stop (both included, negative indexes count from the tail, as in Redis).
+        
+        Only the chunks overlapping the range are fetched, in parallel.
+        
+        Ref: https://redis.io/commands/lrange/
+        """
+        for _ in range(LIST_MAX_RETRIES):
+            meta, _ = self._load_list_meta(key)
+            length = meta['length']
+            start_idx = max(start + length if start < 0 else start, 0)
+            stop_idx = min(stop + length if stop < 0 else stop, length - 1)
+            if start_idx > stop_idx:
+                return []
+            # pick the chunks overlapping [start_idx, stop_idx], with their offset in the list
+            needed = []
+            offset = 0
+            for chunk_id, cnt in meta['chunks']:
+                if offset + cnt > start_idx and offset <= stop_idx:
+                    needed.append((chunk_id, offset))
+                offset += cnt
+            try:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+                    chunks = list(executor.map(lambda c: self._read_list_chunk(key, c[0]), needed))
+            except botocore.exceptions.ClientError as e:
+                # a compaction removed a chunk after we read the metadata: start over
+                if e.response['Error']['Code'] == "NoSuchKey":
+                    continue
+                raise e
+            values = [v for chunk in chunks for v in chunk]
+            first_offset = needed[0][1]
+            
+            return values[start_idx - first_offset:stop_idx - first_offset + 1]
+        
+        raise RuntimeError("List {} keeps changing under us, giving up".format(key))
+    
+    def delete_list(self, key: str):
+        """
+        Delete the list at key (a non-existent list gets ignored, as in delete).
+        """
+        meta, _ = self._load_list_meta(key)
+        prefix = self._get_list_prefix(key)
+        # metadata first, so that nobody sees a list with missing chunks
+        self._s3_client.delete_object(Bucket=self.bucket_name, Key=prefix + 'meta')
+        for chunk_id, _ in meta['chunks']:
+            self._s3_client.delete_object(Bucket=self.bucket_name, Key=prefix + chunk_id)
+        with self._list_lock:
+            self._list_meta_cache.pop((self.db, key), None)
+        
+        return True
+    
+    def _get_compaction_runs(self, chunks: list, chunk_items: int = DEFAULT_LIST_CHUNK_ITEMS):
+        """
+        Group adjacent chunks with fewer than chunk_items items in runs of at most 
+        chunk_items items, and return the runs of more than one chunk (the ones that 
+        compaction merges).
+        """
+        runs = [[]]
+        for chunk_id, cnt in chunks:
+            if cnt >= chunk_items:
+                runs.append([])
+                continue
+            if sum(c for _, c in runs[-1]) + cnt > chunk_items:
+                runs.append([])
+            runs[-1].append((chunk_id, cnt))
+        
+        return [run for run in runs if len(run) > 1]
+    
+    def _count_mergeable_chunks(self, chunks: list):
+        # number of chunks a compaction would remove
+        return sum(len(run) - 1 for run in self._get_compaction_runs(chunks))
+    
+    def _start_list_compaction(self, key: str):
+        cache_key = (self.db, key)
+        with self._list_lock:
+            # only one compaction per list at a time
+            if cache_key in self._list_compacting:
+                return
+            self._list_compacting.add(cache_key)
+        
+        def _compact():
+            try:
+                self.compact_list(key)
+            except Exception as ex:
+                if self._verbose:
+                    print("!!! Failed to compact list {}: {}".format(key, ex))
+            finally:
+                with self._list_lock:
+                    self._list_compacting.discard(cache_key)
+        
+        threading.Thread(target=_compact, daemon=True).start()
+    
+    def compact_list(self, key: str, chunk_items: int = DEFAULT_LIST_CHUNK_ITEMS):
+        """
+        Merge runs of adjacent chunks with fewer than chunk_items items each into one 
+        chunk, so that reads stay bounded however many pushes there were. This runs in 
+        the background when a list gets too many small chunks, but you can call it directly.
+        
+        Pushes can happen while compacting: the new metadata only replaces the merged 
+        chunks, and the old chunks are deleted after it's written. It returns the number 
+        of chunks removed.
+        """
+        meta, _ = self._load_list_meta(key)
+        runs = self._get_compaction_runs(meta['chunks'], chunk_items)
+        if not runs:
+            return 0
+        
+        # write the merged chunks first: until the metadata points to them, nobody reads them
+        merged = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=DEFAULT_MAX_CONCURRENCY) as executor:
+            for run in runs:
+                chunks = executor.map(lambda c: self._read_list_chunk(key, c[0]), run)
+                values = [v for chunk in chunks for v in chunk]
+                merged.append((run, self._write_list_chunk(key, values), len(values)))
+        
+        def _replace_runs(meta):
+            chunks = meta['chunks']
+            for run, merged_id, cnt in merged:
+                run_ids = [c for c, _ in run]
+                ids = [c for c, _ in chunks]
+                # the run may be gone if somebody else compacted the list in the meantime
+                for idx in range(len(ids) - len(run_ids) + 1):
+                    if ids[idx:idx + len(run_ids)] == run_ids:
+                        chunks[idx:idx + len(run_ids)] = [[merged_id, cnt]]
+                        break
+            meta['mergeable_chunks'] = self._count_mergeable_chunks(chunks)
+            return meta
+        
+        meta = self._update_list_meta(key, _replace_runs)
+        # delete what is not referenced anymore: the old chunks, or our merged ones if unused
+        referenced = set(c for c, _ in meta['chunks'])
+        removed = 0
+        for run, merged_id, _ in merged:
+            for chunk_id in ([c for c, _ in run] if merged_id in referenced else [merged_id]):
+                if chunk_id not in referenced:
+                    self._s3_client.delete_object(
+                        Bucket=self.bucket_name,
+                        Key=self._get_list_prefix(key) + chunk_id
+                        )
+            if merged_id in referenced:
+                removed += len(run) - 1
+        if self._verbose:
+            print("Compacted list {}: {} chunks removed".format(key, removed))
+        
+        return removed
+    
+    def _get_process_pool(self):
+        # concurrent mgets must not create (and leak) a pool each
+        with self._process_pool_lock:
+            if self._process_pool is None:
+                # spawn, not fork: the parent has threads (and boto3 clients) that don't survive a fork
+                self._process_pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self._mget_processes,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_mget_worker,
+                    initargs=(self._s3_client_kwargs, )
+                    )
+            
+            return self._process_pool
+    
+    def _mget_multiprocess(self, keys: list):
+        """
+        mget on a process pool: past a couple of cores, the threaded mget is bound by
+        the GIL (botocore parsing and the like), so we split the keys in batches, each
+        fetched by a worker process with its own s3 client, and get the values back 
+        through shared memory instead of pickling them.
+        
+        Batches are sized to give each worker about BATCHES_PER_PROCESS of them (so that
+        a slow batch doesn't hold everybody back), within MIN / MAX_PROCESS_BATCH keys.
+        """
+        values = [None] * len(keys)
+        # the bloom filter (if any) is checked here, so that workers only get plausible keys
+        idxs = [
+            i for i, k in enumerate(keys) 
+            if not self._bloom_filter_enabled or self._bloom_might_contain(k)
+            ]
+        batch_size = math.ceil(len(idxs) / (self._mget_processes * BATCHES_PER_PROCESS))
+        batch_size = min(max(batch_size, MIN_PROCESS_BATCH), MAX_PROCESS_BATCH)
+        batches = [idxs[i:i + batch_size] for i in range(0, len(idxs), batch_size)]
+        if self._verbose:
+            print("Running mget of {} keys in {} batches of {}".format(len(idxs), len(batches), batch_size))
+        
+        pool = self._get_process_pool()
+        futures = {
+            pool.submit(
+                _mget_worker_batch, 
+                self.bucket_name, 
+                [self._get_object_key_from_key_name(keys[i]) for i in batch]
+                ): batch
+            for batch in batches
+            }
+        errors = []
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                shm_name, lengths = future.result()
+                shm = multiprocessing.shared_memory.SharedMemory(name=shm_name)
+            except Exception as ex:
+                # keep going, so that all the shared memory blocks get unlinked
+                errors.append(ex)
+                continue
+            try:
+                offset = 0
+                for i, length in zip(futures[future], lengths):
+                    if length >= 0:
+                        values[i] = str(shm.buf[offset:offset + length], 'utf-8')
+                        offset += length
+            except Exception as ex:
+                # e.g. a value that is not valid utf-8: same as above
+                errors.append(ex)
+            finally:
+                shm.close()
+                shm.unlink()
+        if errors:
+            raise errors[0]
+        
+        return values
+    
+    def close(self):
+        """
+        Stop the mget worker processes, if any (the client can still be used, 
+        and they are started again by the next large mget).
+        """
+        with self._process_pool_lock:
+            if self._process_pool is not None:
+                self._process_pool.shutdown()
+                self._process_pool = None
+        
         return True
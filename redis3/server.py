@@ -0,0 +1,613 @@
+"""
+
+A small asyncio server speaking the Redis wire protocol (RESP2, and RESP3 after HELLO 3),
+so that existing Redis clients and tools can talk to a redis3 cache without code changes:
+
+python -m redis3.server --cache mytestcache --port 6379
+
+and then, from another shell:
+
+redis-cli -p 6379 set foo bar
+redis-cli -p 6379 get foo
+
+All client connections share one redis3Client (and so one boto3 connection pool); SELECT
+is per connection and maps to the db prefix, as in redis3Client. Commands sent in a
+pipeline are run concurrently against s3 when they don't touch the same keys (e.g. a
+pipeline of 100 GETs costs roughly one round trip), and the replies are sent back in order.
+MULTI / EXEC blocks (e.g. redis-py default pipelines) are queued and run the same way at
+EXEC: they are not atomic, as s3 has no transactions.
+
+To test against a local s3 stand-in, pass its url with --endpoint-url.
+
+"""
+
+import asyncio
+import argparse
+import copy
+import fnmatch
+import concurrent.futures
+import botocore.config
+from redis3.redis3 import redis3Client
+
+
+# default number of concurrent s3 ops (and pooled s3 connections), shared by all clients
+DEFAULT_MAX_WORKERS = 50
+# max concurrent s3 ops for the keys of a single multi-key command (e.g. DEL k1 k2 ...)
+MAX_WORKERS_PER_COMMAND = 50
+# default number of keys returned by SCAN when COUNT is not specified
+DEFAULT_SCAN_COUNT = 10
+# commands that can run concurrently with their neighbours in a pipeline (see _get_command_keys)
+READ_COMMANDS = {'GET', 'MGET', 'EXISTS'}
+WRITE_COMMANDS = {'SET', 'MSET', 'DEL'}
+
+
+class ProtocolError(Exception):
+    """
+    The client sent something that is not valid RESP: the connection gets closed.
+    """
+    pass
+
+
+class CommandError(Exception):
+    """
+    A command failed: the message is sent back to the client as a RESP error.
+    """
+    pass
+
+
+class SimpleString(str):
+    """
+    A str to be sent back as a RESP simple string (e.g. OK) instead of a bulk string.
+    """
+    pass
+
+
+class RESPConnection():
+    """
+    Per-connection state: the selected db, the protocol version, the open SCAN cursors
+    and the commands queued after MULTI (None when not in a MULTI block).
+    """
+
+    def __init__(self, client: redis3Client):
+        self.client = client
+        self.protocol = 2
+        self.scans = {}
+        self.next_cursor = 1
+        self.multi = None
+        # a command failed to queue (e.g. unknown command), so EXEC will abort
+        self.multi_failed = False
+
+
+def parse_commands(buffer: bytearray):
+    """
+    Parse all the complete commands in the buffer (arrays of bulk strings, or inline
+    commands as sent by telnet-like clients) and remove them from it: whatever is
+    left is an incomplete command, waiting for more data.
+    """
+    commands = []
+    pos = 0
+    while pos < len(buffer):
+        if buffer[pos:pos + 1] != b'*':
+            # inline command: a space separated line
+            end = buffer.find(b'\n', pos)
+            if end == -1:
+                break
+            args = bytes(buffer[pos:end]).strip().split()
+            if args:
+                commands.append(args)
+            pos = end + 1
+            continue
+
+        end = buffer.find(b'\r\n', pos)
+        if end == -1:
+            break
+        try:
+            arg_cnt = int(buffer[pos + 1:end])
+        except ValueError:
+            raise ProtocolError("invalid multibulk length")
+        cursor = end + 2
+        args = []
+        while len(args) < arg_cnt:
+            if cursor >= len(buffer):
+                break
+            if buffer[cursor:cursor + 1] != b'$':
+                raise ProtocolError("expected '$', got '{}'".format(chr(buffer[cursor])))
+            end = buffer.find(b'\r\n', cursor)
+            if end == -1:
+                break
+            try:
+                arg_len = int(buffer[cursor + 1:end])
+            except ValueError:
+                raise ProtocolError("invalid bulk length")
+            if end + 2 + arg_len + 2 > len(buffer):
+                break
+            args.append(bytes(buffer[end + 2:end + 2 + arg_len]))
+            cursor = end + 2 + arg_len + 2
+        # the array is not complete yet, wait for more data
+        if len(args) < arg_cnt:
+            break
+        if args:
+            commands.append(args)
+        pos = cursor
+
+    del buffer[:pos]
+    return commands
+
+
+def encode_reply(reply, protocol: int = 2):
+    """
+    Serialize a Python value as a RESP reply: None is the null reply, int an integer,
+    str / bytes a bulk string, list an array and dict a map (a flat array in RESP2).
+    """
+    if reply is None:
+        return b'_\r\n' if protocol == 3 else b'$-1\r\n'
+    if isinstance(reply, CommandError):
+        return '-{}\r\n'.format(reply).encode('utf-8')
+    if isinstance(reply, SimpleString):
+        return '+{}\r\n'.format(reply).encode('utf-8')
+    if isinstance(reply, bool):
+        reply = int(reply)
+    if isinstance(reply, int):
+        return ':{}\r\n'.format(reply).encode('utf-8')
+    if isinstance(reply, str):
+        reply = reply.encode('utf-8')
+    if isinstance(reply, bytes):
+        return b'$' + str(len(reply)).encode('utf-8') + b'\r\n' + reply + b'\r\n'
+    if isinstance(reply, dict):
+        if protocol == 3:
+            return b'%' + str(len(reply)).encode('utf-8') + b'\r\n' + b''.join(
+                encode_reply(k, protocol) + encode_reply(v, protocol) for k, v in reply.items()
+                )
+        reply = [x for kv in reply.items() for x in kv]
+    if isinstance(reply, (list, tuple)):
+        return b'*' + str(len(reply)).encode('utf-8') + b'\r\n' + b''.join(
+            encode_reply(x, protocol) for x in reply
+            )
+
+    raise TypeError("Cannot encode reply of type {}".format(type(reply)))
+
+
+def _decode(arg: bytes):
+    try:
+        return arg.decode('utf-8')
+    except UnicodeDecodeError:
+        raise CommandError("ERR redis3 only supports utf-8 keys and values")
+
+
+def _check_arity(args: list, min_cnt: int, max_cnt: int = None):
+    if len(args) < min_cnt or (max_cnt is not None and len(args) > max_cnt):
+        raise CommandError("ERR wrong number of arguments for '{}' command".format(_decode(args[0]).lower()))
+
+
+def _glob_prefix(pattern: str):
+    """
+    Return the literal part of a glob pattern before the first special char, which
+    we can pass to keys() as starts_with.
+    """
+    for idx, c in enumerate(pattern):
+        if c in '*?[\\':
+            return pattern[:idx]
+    return pattern
+
+
+def cmd_get(conn: RESPConnection, args: list):
+    _check_arity(args, 2, 2)
+    return conn.client.get(_decode(args[1]))
+
+
+def cmd_set(conn: RESPConnection, args: list):
+    if len(args) > 3:
+        raise CommandError("ERR SET options are not supported by redis3")
+    _check_arity(args, 3, 3)
+    conn.client.set(_decode(args[1]), _decode(args[2]))
+    return SimpleString('OK')
+
+
+def cmd_mget(conn: RESPConnection, args: list):
+    _check_arity(args, 2)
+    return conn.client.mget([_decode(k) for k in args[1:]])
+
+
+def cmd_mset(conn: RESPConnection, args: list):
+    if len(args) < 3 or len(args) % 2 == 0:
+        raise CommandError("ERR wrong number of arguments for 'mset' command")
+    conn.client.mset([_decode(k) for k in args[1::2]], [_decode(v) for v in args[2::2]])
+    return SimpleString('OK')
+
+
+def _run_per_key(func, keys: list):
+    """
+    Run func on each key concurrently (one s3 round trip for the lot, instead of one
+    per key), and return the results in order.
+    """
+    if len(keys) == 1:
+        return [func(keys[0])]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(keys), MAX_WORKERS_PER_COMMAND)) as executor:
+        return list(executor.map(func, keys))
+
+
+def _delete_if_exists(client: redis3Client, key: str):
+    # s3 doesn't tell us if a delete removed something, so we check first
+    if not client.exists(key):
+        return False
+    return client.delete(key)
+
+
+def cmd_del(conn: RESPConnection, args: list):
+    _check_arity(args, 2)
+    # a key repeated in the same DEL is deleted (and counted) once, as in Redis
+    keys = list(dict.fromkeys(_decode(k) for k in args[1:]))
+    return sum(_run_per_key(lambda k: _delete_if_exists(conn.client, k), keys))
+
+
+def cmd_exists(conn: RESPConnection, args: list):
+    _check_arity(args, 2)
+    return sum(_run_per_key(conn.client.exists, [_decode(k) for k in args[1:]]))
+
+
+def cmd_keys(conn: RESPConnection, args: list):
+    _check_arity(args, 2, 2)
+    pattern = _decode(args[1])
+    return [
+        k for k in conn.client.keys(starts_with=_glob_prefix(pattern))
+        if fnmatch.fnmatchcase(k, pattern)
+        ]
+
+
+def cmd_scan(conn: RESPConnection, args: list):
+    """
+    SCAN cursor [MATCH pattern] [COUNT count]: cursors are ids of listing generators
+    kept in the connection, so they are only valid for the connection that opened them.
+    """
+    _check_arity(args, 2)
+    try:
+        cursor = int(args[1])
+    except ValueError:
+        raise CommandError("ERR invalid cursor")
+    pattern = None
+    count = DEFAULT_SCAN_COUNT
+    options = args[2:]
+    if len(options) % 2 != 0:
+        raise CommandError("ERR syntax error")
+    for option, value in zip(options[::2], options[1::2]):
+        option = _decode(option).upper()
+        if option == 'MATCH':
+            pattern = _decode(value)
+        elif option == 'COUNT':
+            try:
+                count = int(value)
+            except ValueError:
+                raise CommandError("ERR value is not an integer or out of range")
+        else:
+            raise CommandError("ERR syntax error")
+
+    if cursor == 0:
+        keys = conn.client.keys(starts_with=_glob_prefix(pattern) if pattern else None)
+    elif cursor in conn.scans:
+        keys = conn.scans.pop(cursor)
+    else:
+        raise CommandError("ERR invalid cursor")
+
+    found = []
+    for _ in range(count):
+        k = next(keys, None)
+        if k is None:
+            return ['0', found]
+        if pattern is None or fnmatch.fnmatchcase(k, pattern):
+            found.append(k)
+
+    next_cursor = conn.next_cursor
+    conn.next_cursor += 1
+    conn.scans[next_cursor] = keys
+    return [str(next_cursor), found]
+
+
+def cmd_copy(conn: RESPConnection, args: list):
+    """
+    COPY source destination [DB destination-db] [REPLACE]
+    """
+    _check_arity(args, 3)
+    db = None
+    replace = False
+    options = [_decode(o).upper() for o in args[3:]]
+    while options:
+        option = options.pop(0)
+        if option == 'REPLACE':
+            replace = True
+        elif option == 'DB' and options:
+            try:
+                db = int(options.pop(0))
+            except ValueError:
+                raise CommandError("ERR value is not an integer or out of range")
+        else:
+            raise CommandError("ERR syntax error")
+    return conn.client.copy(_decode(args[1]), _decode(args[2]), db=db, replace=replace)
+
+
+def cmd_rename(conn: RESPConnection, args: list):
+    _check_arity(args, 3, 3)
+    if not conn.client.rename(_decode(args[1]), _decode(args[2])):
+        raise CommandError("ERR no such key")
+    return SimpleString('OK')
+
+
+def cmd_move(conn: RESPConnection, args: list):
+    _check_arity(args, 3, 3)
+    try:
+        db = int(args[2])
+    except ValueError:
+        raise CommandError("ERR value is not an integer or out of range")
+    return conn.client.move(_decode(args[1]), db)
+
+
+def cmd_ping(conn: RESPConnection, args: list):
+    _check_arity(args, 1, 2)
+    return args[1] if len(args) == 2 else SimpleString('PONG')
+
+
+def cmd_echo(conn: RESPConnection, args: list):
+    _check_arity(args, 2, 2)
+    return args[1]
+
+
+def cmd_client(conn: RESPConnection, args: list):
+    # CLIENT SETNAME / SETINFO and friends are sent by many clients on connect: just ack them
+    return SimpleString('OK')
+
+
+def cmd_command(conn: RESPConnection, args: list):
+    return []
+
+
+# command name -> handler(conn, args), where args[0] is the command name itself
+COMMANDS = {
+    'GET': cmd_get,
+    'SET': cmd_set,
+    'MGET': cmd_mget,
+    'MSET': cmd_mset,
+    'DEL': cmd_del,
+    'EXISTS': cmd_exists,
+    'KEYS': cmd_keys,
+    'SCAN': cmd_scan,
+    'COPY': cmd_copy,
+    'RENAME': cmd_rename,
+    'MOVE': cmd_move,
+    'PING': cmd_ping,
+    'ECHO': cmd_echo,
+    'CLIENT': cmd_client,
+    'COMMAND': cmd_command,
+}
+
+
+def _get_command_keys(name: str, args: list):
+    """
+    Return the keys read / written by a command that can run concurrently with others.
+    """
+    if name == 'MSET':
+        return set(args[1::2])
+    return set(args[1:2] if name in ('GET', 'SET') else args[1:])
+
+
+class RESPServer():
+
+    def __init__(
+        self,
+        client: redis3Client,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        verbose: bool = False
+        ):
+        """
+        Serve the cache behind client to Redis clients. The db of the client is the one
+        new connections start on, SELECT switches to a (shallow) copy of the client
+        with a different db, sharing the underlying boto3 client.
+        """
+        self._client = client
+        self._clients_by_db = {client.db: client}
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._verbose = verbose
+
+    def _get_client_for_db(self, db: int):
+        if db not in self._clients_by_db:
+            db_client = copy.copy(self._client)
+            db_client.db = db
+            self._clients_by_db[db] = db_client
+
+        return self._clients_by_db[db]
+
+    async def start(self, host: str = '127.0.0.1', port: int = 6379):
+        """
+        Start listening and return the asyncio server (use serve_forever on it,
+        or close it when you are done).
+        """
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        if self._verbose:
+            print("Serving {} on {}:{}".format(self._client.bucket_name, host, port))
+
+        return server
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        conn = RESPConnection(self._client)
+        buffer = bytearray()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                buffer += data
+                # all the commands we have in the buffer are treated as one pipeline
+                commands = parse_commands(buffer)
+                if not commands:
+                    continue
+                replies, quit = await self._execute_pipeline(conn, commands)
+                writer.write(b''.join(encode_reply(r, conn.protocol) for r in replies))
+                await writer.drain()
+                if quit:
+                    break
+        except ProtocolError as e:
+            writer.write(encode_reply(CommandError("ERR Protocol error: {}".format(e))))
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _execute_pipeline(self, conn: RESPConnection, commands: list):
+        """
+        Run the commands and return the list of replies (in order), plus whether
+        the client asked to QUIT. Consecutive GET / SET-like commands are run
+        concurrently, unless one writes a key that another one reads or writes.
+        """
+        replies = []
+        batch = []
+        read_keys = set()
+        write_keys = set()
+        for args in commands:
+            name = args[0].decode('utf-8', errors='replace').upper()
+            if conn.multi is not None and name not in ('MULTI', 'EXEC', 'DISCARD', 'QUIT'):
+                if name in COMMANDS or name in ('SELECT', 'HELLO'):
+                    conn.multi.append(args)
+                    replies.append(SimpleString('QUEUED'))
+                else:
+                    conn.multi_failed = True
+                    replies.append(CommandError("ERR unknown command '{}'".format(name.lower())))
+                continue
+            if name in READ_COMMANDS or name in WRITE_COMMANDS:
+                keys = _get_command_keys(name, args)
+                conflicts = keys & write_keys if name in READ_COMMANDS else keys & (read_keys | write_keys)
+                if conflicts:
+                    replies.extend(await self._run_batch(batch))
+                    batch, read_keys, write_keys = [], set(), set()
+                batch.append((conn, args))
+                (read_keys if name in READ_COMMANDS else write_keys).update(keys)
+                continue
+
+            # anything else runs on its own, after the current batch
+            replies.extend(await self._run_batch(batch))
+            batch, read_keys, write_keys = [], set(), set()
+            if name == 'QUIT':
+                replies.append(SimpleString('OK'))
+                return replies, True
+            if name in ('MULTI', 'EXEC', 'DISCARD'):
+                replies.append(await self._run_multi_command(conn, name))
+                continue
+            replies.append(await self._run_command(conn, args))
+
+        replies.extend(await self._run_batch(batch))
+        return replies, False
+
+    async def _run_multi_command(self, conn: RESPConnection, name: str):
+        """
+        MULTI starts queueing commands, EXEC runs the queue as a pipeline (so not
+        atomically: other connections can see the writes as they happen) and
+        replies with the array of their replies, DISCARD drops the queue.
+        """
+        if name == 'MULTI':
+            if conn.multi is not None:
+                return CommandError("ERR MULTI calls can not be nested")
+            conn.multi = []
+            conn.multi_failed = False
+            return SimpleString('OK')
+        if conn.multi is None:
+            return CommandError("ERR {} without MULTI".format(name))
+
+        commands, failed = conn.multi, conn.multi_failed
+        conn.multi, conn.multi_failed = None, False
+        if name == 'DISCARD':
+            return SimpleString('OK')
+        if failed:
+            return CommandError("EXECABORT Transaction discarded because of previous errors.")
+        replies, _ = await self._execute_pipeline(conn, commands)
+        return replies
+
+    async def _run_batch(self, batch: list):
+        return await asyncio.gather(*[self._run_command(conn, args) for conn, args in batch])
+
+    async def _run_command(self, conn: RESPConnection, args: list):
+        name = args[0].decode('utf-8', errors='replace').upper()
+        try:
+            # connection-level commands don't need s3, so we handle them here
+            if name == 'SELECT':
+                _check_arity(args, 2, 2)
+                try:
+                    conn.client = self._get_client_for_db(int(args[1]))
+                except ValueError:
+                    raise CommandError("ERR DB index is out of range")
+                conn.scans = {}
+                return SimpleString('OK')
+            if name == 'HELLO':
+                return self._hello(conn, args)
+            if name not in COMMANDS:
+                raise CommandError("ERR unknown command '{}'".format(name.lower()))
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, COMMANDS[name], conn, args)
+        except CommandError as e:
+            return e
+        except Exception as e:
+            if self._verbose:
+                print("!!! Failed command {}: {}".format(name, e))
+            return CommandError("ERR {}".format(e))
+
+    def _hello(self, conn: RESPConnection, args: list):
+        """
+        HELLO [protover [AUTH username password] [SETNAME clientname]]: switch protocol
+        (auth is up to AWS credentials, so it's ignored).
+        """
+        if len(args) > 1:
+            try:
+                protocol = int(args[1])
+            except ValueError:
+                raise CommandError("ERR Protocol version is not an integer or out of range")
+            if protocol not in (2, 3):
+                raise CommandError("NOPROTO unsupported protocol version")
+            conn.protocol = protocol
+
+        return {
+            'server': 'redis3',
+            'version': '0.0.2',
+            'proto': conn.protocol,
+            'id': id(conn),
+            'mode': 'standalone',
+            'role': 'master',
+            'modules': [],
+        }
+
+
+async def serve(
+    client: redis3Client,
+    host: str = '127.0.0.1',
+    port: int = 6379,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    verbose: bool = False
+    ):
+    server = await RESPServer(client, max_workers=max_workers, verbose=verbose).start(host, port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a redis3 cache over the Redis protocol")
+    parser.add_argument('--cache', required=True, help="name of the cache to serve")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    parser.add_argument('--db', type=int, default=0, help="db new connections start on")
+    parser.add_argument('--availability-zone', default='use1-az5')
+    parser.add_argument('--bucket-prefix', default='redis3')
+    parser.add_argument('--endpoint-url', default=None, help="s3 endpoint, e.g. a local s3 stand-in")
+    parser.add_argument('--max-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help="max concurrent s3 ops (and pooled s3 connections)")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    # size the boto3 pool as the executor, so that concurrent ops don't queue for a connection
+    client_kwargs = {'config': botocore.config.Config(max_pool_connections=args.max_workers)}
+    if args.endpoint_url:
+        client_kwargs['endpoint_url'] = args.endpoint_url
+    client = redis3Client(
+        cache_name=args.cache,
+        db=args.db,
+        availability_zone=args.availability_zone,
+        bucket_prefix=args.bucket_prefix,
+        verbose=args.verbose,
+        **client_kwargs
+        )
+    asyncio.run(serve(client, args.host, args.port, args.max_workers, args.verbose))
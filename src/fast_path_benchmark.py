@@ -0,0 +1,86 @@
+"""
+
+Compare the per-op latency and CPU time of the default boto3 transport with the fast path
+(redis3Client(..., fast_path=True)), for sequential sets / gets and for a large mget, where
+the CPU cost of botocore matters the most.
+
+Run it with your own cache name:
+
+python fast_path_benchmark.py my-cache-name
+
+or offline, against a local s3 stand-in:
+
+python fast_path_benchmark.py my-cache-name --endpoint-url http://127.0.0.1:5000
+
+"""
+
+import argparse
+from time import perf_counter, process_time
+from statistics import mean, median
+from datetime import datetime
+from redis3.redis3 import redis3Client
+
+
+def measure_ops(func, args_list: list):
+    """
+    Run func on each args, and return the list of wall times and the CPU time per op (in ms).
+    """
+    wall_times = []
+    cpu_start = process_time()
+    for args in args_list:
+        start = perf_counter()
+        func(*args)
+        wall_times.append((perf_counter() - start) * 1000)
+
+    return wall_times, (process_time() - cpu_start) * 1000 / len(args_list)
+
+
+def run_benchmark(
+    cache_name: str,
+    k: int = 1000,
+    mget_size: int = 500,
+    value_size: int = 100,
+    **kwargs
+):
+    print("Started fast path benchmark at {}\n".format(datetime.now()))
+    test_keys = ['fast_path_{}'.format(i) for i in range(k)]
+    test_value = 'x' * value_size
+    results = {}
+    for fast_path in (False, True):
+        my_client = redis3Client(cache_name=cache_name, db=0, verbose=False, fast_path=fast_path, **kwargs)
+        # warm up connections (and session credentials) before measuring
+        my_client.set(test_keys[0], test_value)
+        my_client.get(test_keys[0])
+        set_times, set_cpu = measure_ops(my_client.set, [(key, test_value) for key in test_keys])
+        get_times, get_cpu = measure_ops(my_client.get, [(key, ) for key in test_keys])
+        mget_times, mget_cpu = measure_ops(my_client.mget, [(test_keys[:mget_size], )] * 5)
+        results['fast path' if fast_path else 'boto3'] = {
+            'set': (mean(set_times), median(set_times), set_cpu),
+            'get': (mean(get_times), median(get_times), get_cpu),
+            # for mget, CPU is per key
+            'mget': (mean(mget_times), median(mget_times), mget_cpu / mget_size),
+        }
+
+    print("{:>10} {:>5} {:>12} {:>12} {:>14}".format('transport', 'op', 'mean (ms)', 'median (ms)', 'CPU/key (ms)'))
+    for transport, ops in results.items():
+        for op, (avg, med, cpu) in ops.items():
+            print("{:>10} {:>5} {:>12.3f} {:>12.3f} {:>14.4f}".format(transport, op, avg, med, cpu))
+    for op in ('set', 'get', 'mget'):
+        print("{}: fast path uses {:.1f}% of boto3 CPU time per key".format(
+            op, 100 * results['fast path'][op][2] / results['boto3'][op][2]))
+
+    print("\nFinished fast path benchmark at {}. See you, s3ace cowboy".format(datetime.now()))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare boto3 and the fast path transport")
+    parser.add_argument('cache_name')
+    parser.add_argument('--k', type=int, default=1000, help="number of keys to set / get")
+    parser.add_argument('--mget-size', type=int, default=500, help="number of keys per mget")
+    parser.add_argument('--value-size', type=int, default=100, help="value size in bytes")
+    parser.add_argument('--endpoint-url', default=None, help="s3 endpoint, e.g. a local s3 stand-in")
+    args = parser.parse_args()
+
+    client_kwargs = {'endpoint_url': args.endpoint_url} if args.endpoint_url else {}
+    run_benchmark(args.cache_name, k=args.k, mget_size=args.mget_size, value_size=args.value_size, **client_kwargs)
@@ -0,0 +1,373 @@
+"""
+
+Load generator for capacity planning: drive a redis3Client with either a recorded trace of
+operations or a synthetic workload, and report throughput, latency percentiles over time and
+the estimated s3 request cost.
+
+The load is open-loop: operations are scheduled at their intended time, no matter how many are
+still in flight, and latency is measured from the intended start (not from when a worker picked
+the operation up). This way, a slow cache shows up as higher latency, instead of being hidden by
+a lower request rate (i.e. "coordinated omission").
+
+Synthetic workloads are described by a JSON spec, overriding DEFAULT_SPEC, e.g.:
+
+{"duration": 60, "ops_per_sec": 200, "clients": 32, "key_distribution": "zipf", "read_ratio": 0.95,
+ "value_size": {"distribution": "lognormal", "mu": 6, "sigma": 1}}
+
+Traces are JSON lines, one op per line, with the offset in seconds from the start of the run:
+
+{"t": 0.01, "op": "get", "key": "foo"}
+{"t": 0.02, "op": "set", "key": "foo", "size": 100}
+{"t": 0.03, "op": "mget", "keys": ["foo", "bar"]}
+
+Run it with your own cache name (use --record to save the synthetic ops as a trace to replay later):
+
+python load_generator.py my-cache-name --spec spec.json --record trace.jsonl
+python load_generator.py my-cache-name --trace trace.jsonl
+
+To run it offline, point it to a local s3 stand-in with --endpoint-url.
+
+"""
+
+import json
+import math
+import random
+import string
+import bisect
+import argparse
+import threading
+import concurrent.futures
+from time import perf_counter, sleep
+from datetime import datetime
+import botocore.config
+from redis3.redis3 import redis3Client
+
+
+DEFAULT_SPEC = {
+    'duration': 30, # seconds
+    'ops_per_sec': 100, # target rate of the open-loop load
+    'arrivals': 'poisson', # or 'constant' (i.e. evenly spaced ops)
+    'clients': 16, # concurrent workers, i.e. max ops in flight
+    'num_keys': 10000,
+    'key_distribution': 'zipf', # or 'uniform'
+    'zipf_s': 0.99,
+    'read_ratio': 0.9,
+    # 'fixed' (size), 'uniform' (min, max) or 'lognormal' (mu, sigma), in bytes
+    'value_size': {'distribution': 'fixed', 'size': 100},
+    'preload': False, # set all the keys before the run, so that reads are hits
+    'seed': 42,
+}
+
+# s3 Express One Zone prices in US East, as of Dec 2023 (as in the README): override them with
+# the 'pricing' key in the spec if yours are different
+DEFAULT_PRICING = {
+    'put_per_1000': 0.0025, # PUT, COPY, POST, LIST
+    'get_per_1000': 0.0002, # GET, HEAD and all other requests
+    'upload_per_gb': 0.008, # for the portion of any request that exceeds 512 KB
+    'retrieval_per_gb': 0.0015,
+}
+FREE_BYTES_PER_REQUEST = 512 * 1024
+
+
+def percentile(input, q):
+    """
+    I don't want to import numpy just for this (nearest-rank method)
+    """
+    data_sorted = sorted(input)
+    if not data_sorted:
+        return float('nan')
+
+    return data_sorted[max(0, math.ceil(q / 100 * len(data_sorted)) - 1)]
+
+
+def generate_synthetic_ops(spec: dict):
+    """
+    Yield the ops of a synthetic workload as dicts (same format as a trace line), in time order.
+    """
+    rnd = random.Random(spec['seed'])
+    num_keys = spec['num_keys']
+    if spec['key_distribution'] == 'zipf':
+        # precompute the CDF once, then sample with a binary search
+        weights = [1.0 / (i + 1) ** spec['zipf_s'] for i in range(num_keys)]
+        total = sum(weights)
+        cdf = []
+        acc = 0.0
+        for w in weights:
+            acc += w
+            cdf.append(acc / total)
+        sample_key = lambda: min(bisect.bisect_left(cdf, rnd.random()), num_keys - 1)
+    elif spec['key_distribution'] == 'uniform':
+        sample_key = lambda: rnd.randrange(num_keys)
+    else:
+        raise ValueError("Unknown key distribution {}".format(spec['key_distribution']))
+
+    size_spec = spec['value_size']
+    if size_spec['distribution'] == 'fixed':
+        sample_size = lambda: size_spec['size']
+    elif size_spec['distribution'] == 'uniform':
+        sample_size = lambda: rnd.randint(size_spec['min'], size_spec['max'])
+    elif size_spec['distribution'] == 'lognormal':
+        sample_size = lambda: max(1, int(rnd.lognormvariate(size_spec['mu'], size_spec['sigma'])))
+    else:
+        raise ValueError("Unknown value size distribution {}".format(size_spec['distribution']))
+
+    t = 0.0
+    while True:
+        if spec['arrivals'] == 'poisson':
+            t += rnd.expovariate(spec['ops_per_sec'])
+        else:
+            t += 1.0 / spec['ops_per_sec']
+        if t >= spec['duration']:
+            return
+        key = 'load_{}'.format(sample_key())
+        if rnd.random() < spec['read_ratio']:
+            yield {'t': t, 'op': 'get', 'key': key}
+        else:
+            yield {'t': t, 'op': 'set', 'key': key, 'size': sample_size()}
+
+
+def read_trace(path: str):
+    """
+    Yield the ops of a recorded trace (JSON lines), which must be in time order.
+    """
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class ValueFactory():
+    """
+    Produce values of a given size without paying for random generation at each op:
+    we slice a random string, growing it when a larger value is needed.
+    """
+
+    def __init__(self, seed: int = 42):
+        self._rnd = random.Random(seed)
+        self._base = ''
+        self._lock = threading.Lock()
+
+    def get(self, size: int):
+        with self._lock:
+            if size > len(self._base):
+                self._base += ''.join(self._rnd.choices(string.ascii_letters, k=size - len(self._base)))
+
+        return self._base[:size]
+
+
+def run_op(client: redis3Client, op: dict, values: ValueFactory):
+    """
+    Run one op and return the number of (get-like requests, put-like requests,
+    bytes read, bytes written) it caused, for the cost estimate.
+    """
+    if op['op'] == 'get':
+        v = client.get(op['key'])
+        return 1, 0, len(v) if v else 0, 0
+    if op['op'] == 'set':
+        client.set(op['key'], values.get(op['size']))
+        return 0, 1, 0, op['size']
+    if op['op'] == 'mget':
+        vs = client.mget(op['keys'])
+        return len(vs), 0, sum(len(v) for v in vs if v), 0
+    if op['op'] == 'mset':
+        client.mset(op['keys'], [values.get(op['size'])] * len(op['keys']))
+        return 0, len(op['keys']), 0, op['size'] * len(op['keys'])
+    if op['op'] == 'delete':
+        client.delete(op['key'])
+        # DELETE is free on s3
+        return 0, 0, 0, 0
+
+    raise ValueError("Unknown op {}".format(op['op']))
+
+
+def run_load(
+    client: redis3Client,
+    ops,
+    clients: int,
+    report_interval: float = 5.0,
+    record_path: str = None
+):
+    """
+    Run the ops open-loop on a pool of clients workers, and return one record per op:
+    (intended start, latency, service time, op name, error, get requests, put requests,
+    bytes read, bytes written), all times in seconds from the start of the run.
+    """
+    values = ValueFactory()
+    records = []
+    records_lock = threading.Lock()
+    record_file = open(record_path, 'w') if record_path else None
+
+    def _timed_op(op, intended_start):
+        service_start = perf_counter()
+        error = None
+        counts = (0, 0, 0, 0)
+        try:
+            counts = run_op(client, op, values)
+        except Exception as ex:
+            error = type(ex).__name__
+        end = perf_counter()
+        with records_lock:
+            records.append((
+                intended_start - run_start,
+                end - intended_start, # includes the time waiting for a free worker
+                end - service_start,
+                op['op'],
+                error,
+                *counts
+            ))
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=clients)
+    run_start = perf_counter()
+    next_report = report_interval
+    submitted = 0
+    try:
+        for op in ops:
+            if record_file:
+                record_file.write(json.dumps(op) + '\n')
+            intended_start = run_start + op['t']
+            delay = intended_start - perf_counter()
+            if delay > 0:
+                sleep(delay)
+            # open-loop: we never wait for a worker, ops queue up in the executor instead
+            executor.submit(_timed_op, op, intended_start)
+            submitted += 1
+            if op['t'] >= next_report:
+                with records_lock:
+                    completed = len(records)
+                print("[{:.0f}s] submitted {} ops, completed {}, in flight {}".format(
+                    op['t'], submitted, completed, submitted - completed))
+                next_report += report_interval
+    finally:
+        executor.shutdown(wait=True)
+        if record_file:
+            record_file.close()
+
+    return records
+
+
+def print_report(records: list, report_interval: float, pricing: dict):
+    """
+    Print the latency percentiles per time window, the totals and the estimated cost.
+    """
+    if not records:
+        print("No ops were run")
+        return
+
+    print("\n{:>8} {:>10} {:>10} {:>10} {:>10} {:>10} {:>8}".format(
+        'window', 'ops/s', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'max (ms)', 'errors'))
+    n_windows = int(max(r[0] for r in records) // report_interval) + 1
+    for w in range(n_windows):
+        window = [r for r in records if w * report_interval <= r[0] < (w + 1) * report_interval]
+        latencies = [r[1] * 1000 for r in window]
+        print("{:>7.0f}s {:>10.1f} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f} {:>8}".format(
+            w * report_interval,
+            len(window) / report_interval,
+            percentile(latencies, 50),
+            percentile(latencies, 95),
+            percentile(latencies, 99),
+            max(latencies, default=float('nan')),
+            sum(1 for r in window if r[4])
+        ))
+
+    duration = max(r[0] + r[1] for r in records)
+    latencies = [r[1] * 1000 for r in records]
+    service_times = [r[2] * 1000 for r in records]
+    print("\nOps: {} in {:.2f}s ({:.1f} ops/s), errors: {}".format(
+        len(records), duration, len(records) / duration, sum(1 for r in records if r[4])))
+    for op_name in sorted(set(r[3] for r in records)):
+        op_latencies = [r[1] * 1000 for r in records if r[3] == op_name]
+        print("{}: {} ops, p50 {:.2f}ms, p95 {:.2f}ms, p99 {:.2f}ms".format(
+            op_name, len(op_latencies),
+            percentile(op_latencies, 50), percentile(op_latencies, 95), percentile(op_latencies, 99)))
+    print("Latency (from intended start): p50 {:.2f}ms, p99 {:.2f}ms, p99.9 {:.2f}ms".format(
+        percentile(latencies, 50), percentile(latencies, 99), percentile(latencies, 99.9)))
+    print("Service time (excluding queueing): p50 {:.2f}ms, p99 {:.2f}ms".format(
+        percentile(service_times, 50), percentile(service_times, 99)))
+
+    # cost: per-request fees, plus per-GB fees for the portion of each request over 512KB;
+    # for mget / mset we approximate by spreading the bytes evenly over the requests
+    gets = sum(r[5] for r in records)
+    puts = sum(r[6] for r in records)
+    over_read = sum(max(0, r[7] / r[5] - FREE_BYTES_PER_REQUEST) * r[5] for r in records if r[5])
+    over_written = sum(max(0, r[8] / r[6] - FREE_BYTES_PER_REQUEST) * r[6] for r in records if r[6])
+    cost = (
+        gets / 1000 * pricing['get_per_1000'] +
+        puts / 1000 * pricing['put_per_1000'] +
+        over_read / 1024 ** 3 * pricing['retrieval_per_gb'] +
+        over_written / 1024 ** 3 * pricing['upload_per_gb']
+    )
+    print("Estimated s3 cost: ${:.6f} for {} GETs and {} PUTs (${:.4f} per million ops, ${:.2f} per month at this rate)".format(
+        cost, gets, puts, cost / len(records) * 1e6, cost / duration * 3600 * 24 * 30))
+
+    return
+
+
+def get_mean_value_size(size_spec: dict):
+    """
+    Mean of the value size distribution in the spec, in bytes.
+    """
+    if size_spec['distribution'] == 'fixed':
+        return size_spec['size']
+    if size_spec['distribution'] == 'uniform':
+        return (size_spec['min'] + size_spec['max']) // 2
+    if size_spec['distribution'] == 'lognormal':
+        return max(1, int(math.exp(size_spec['mu'] + size_spec['sigma'] ** 2 / 2)))
+
+    raise ValueError("Unknown value size distribution {}".format(size_spec['distribution']))
+
+
+def run_load_generator(
+    cache_name: str,
+    spec: dict = None,
+    trace_path: str = None,
+    record_path: str = None,
+    report_interval: float = 5.0,
+    **kwargs
+):
+    print("Started load generator at {}\n".format(datetime.now()))
+    spec = {**DEFAULT_SPEC, **(spec or {})}
+    # make sure the workers don't queue for a connection in the boto3 pool
+    kwargs.setdefault('config', botocore.config.Config(max_pool_connections=spec['clients']))
+    my_client = redis3Client(cache_name=cache_name, db=0, verbose=False, **kwargs)
+    if trace_path:
+        ops = read_trace(trace_path)
+    else:
+        if spec['preload']:
+            print("Preloading {} keys".format(spec['num_keys']))
+            values = ValueFactory(spec['seed'])
+            keys = ['load_{}'.format(i) for i in range(spec['num_keys'])]
+            # use the average size for the preloaded values
+            size = get_mean_value_size(spec['value_size'])
+            for i in range(0, len(keys), 1000):
+                my_client.mset(keys[i:i + 1000], [values.get(size)] * len(keys[i:i + 1000]))
+        ops = generate_synthetic_ops(spec)
+
+    records = run_load(my_client, ops, spec['clients'], report_interval, record_path)
+    print_report(records, report_interval, {**DEFAULT_PRICING, **spec.get('pricing', {})})
+    print("\nFinished load generator at {}. See you, s3ace cowboy".format(datetime.now()))
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a trace or a synthetic workload against a redis3 cache")
+    parser.add_argument('cache_name')
+    parser.add_argument('--spec', default=None, help="JSON file with the synthetic workload spec")
+    parser.add_argument('--trace', default=None, help="JSON lines file with the ops to replay")
+    parser.add_argument('--record', default=None, help="save the ops that are run as a trace")
+    parser.add_argument('--report-interval', type=float, default=5.0, help="seconds per report window")
+    parser.add_argument('--endpoint-url', default=None, help="s3 endpoint, e.g. a local s3 stand-in")
+    args = parser.parse_args()
+
+    spec = None
+    if args.spec:
+        with open(args.spec) as f:
+            spec = json.load(f)
+    client_kwargs = {'endpoint_url': args.endpoint_url} if args.endpoint_url else {}
+    run_load_generator(
+        args.cache_name,
+        spec=spec,
+        trace_path=args.trace,
+        record_path=args.record,
+        report_interval=args.report_interval,
+        **client_kwargs
+    )
@@ -0,0 +1,91 @@
+"""
+
+Measure how a very large mget scales with the number of worker processes
+(redis3Client(..., mget_processes=n)), from the threaded mget (0 processes) up to
+the number of cores of the machine.
+
+Run it with your own cache name:
+
+python mget_process_benchmark.py my-cache-name
+
+or offline, against a local s3 stand-in:
+
+python mget_process_benchmark.py my-cache-name --endpoint-url http://127.0.0.1:5000
+
+"""
+
+import os
+import argparse
+from time import perf_counter
+from statistics import median
+from datetime import datetime
+from redis3.redis3 import redis3Client
+
+
+def get_process_counts(max_processes: int):
+    """
+    0 (threads only), then powers of 2 up to max_processes (included).
+    """
+    counts = [0]
+    n = 1
+    while n < max_processes:
+        counts.append(n)
+        n *= 2
+    counts.append(max_processes)
+
+    return counts
+
+
+def run_benchmark(
+    cache_name: str,
+    k: int = 20000,
+    value_size: int = 1000,
+    repeats: int = 3,
+    max_processes: int = None,
+    **kwargs
+):
+    print("Started mget process benchmark at {}\n".format(datetime.now()))
+    test_keys = ['mget_process_{}'.format(i) for i in range(k)]
+    my_client = redis3Client(cache_name=cache_name, db=0, verbose=False, **kwargs)
+    my_client.mset(test_keys, ['x' * value_size] * k)
+    results = {}
+    for n in get_process_counts(max_processes or os.cpu_count()):
+        my_client = redis3Client(cache_name=cache_name, db=0, verbose=False, mget_processes=n, **kwargs)
+        # warm up (worker processes, connections) before measuring
+        my_client.mget(test_keys)
+        times = []
+        for _ in range(repeats):
+            start = perf_counter()
+            values = my_client.mget(test_keys)
+            times.append(perf_counter() - start)
+            assert all(v is not None for v in values)
+        my_client.close()
+        results[n] = k / median(times)
+
+    print("{:>10} {:>12} {:>10}".format('processes', 'keys/s', 'speedup'))
+    for n, keys_per_second in results.items():
+        print("{:>10} {:>12.0f} {:>9.2f}x".format(n, keys_per_second, keys_per_second / results[0]))
+
+    print("\nFinished mget process benchmark at {}. See you, s3ace cowboy".format(datetime.now()))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure mget throughput by number of worker processes")
+    parser.add_argument('cache_name')
+    parser.add_argument('--k', type=int, default=20000, help="number of keys per mget")
+    parser.add_argument('--value-size', type=int, default=1000, help="value size in bytes")
+    parser.add_argument('--repeats', type=int, default=3, help="mget runs per process count")
+    parser.add_argument('--max-processes', type=int, default=None, help="defaults to the number of cores")
+    parser.add_argument('--endpoint-url', default=None, help="s3 endpoint, e.g. a local s3 stand-in")
+    args = parser.parse_args()
+
+    client_kwargs = {'endpoint_url': args.endpoint_url} if args.endpoint_url else {}
+    run_benchmark(
+        args.cache_name,
+        k=args.k,
+        value_size=args.value_size,
+        repeats=args.repeats,
+        max_processes=args.max_processes,
+        **client_kwargs
+    )
@@ -7,14 +7,18 @@ in which we compare standard S3 buckets with the express bucket.
 
 import boto3
 import uuid
-from time import time
+from time import time, sleep
 from statistics import median, mean
 from tqdm import tqdm
 from datetime import datetime
 from redis3.redis3 import redis3Client
 import math
 import json
+import io
+import os
 import uuid
+import tempfile
+import concurrent.futures
 
 
 def print_test_info(
@@ -142,6 +146,149 @@ def run_functional_tests(
     assert all(r), "Expected all True, got {}".format(r)
     val_list_back = my_client.mget(key_list)    
     assert val_list_back == val_list, "Expected {}, got {}".format(val_list, val_list_back)
+    # get them back with a latency budget and per-key statuses
+    val_list_back, statuses = my_client.mget(key_list + [str(uuid.uuid4())], timeout=5, partial=True)
+    assert val_list_back[:-1] == val_list, "Expected {}, got {}".format(val_list, val_list_back)
+    assert statuses == ['ok'] * len(key_list) + ['missing'], "Unexpected statuses {}".format(statuses)
+    # a budget shorter than any round trip must fire, for single and multi-key ops
+    for timed_op in (lambda: my_client.get('foo', timeout=0.001), lambda: list(my_client.keys(timeout=0.001))):
+        start = time()
+        try:
+            timed_op()
+            assert False, "Expected a timeout"
+        except concurrent.futures.TimeoutError:
+            assert time() - start < 0.5, "Timed out after {}s, way past the budget".format(time() - start)
+    val_list_back, statuses = my_client.mget(key_list, timeout=0.001, partial=True)
+    assert statuses == ['timed-out'] * len(key_list), "Unexpected statuses {}".format(statuses)
+    # stream a value larger than one part and read it back in parallel ranges
+    big_value = uuid.uuid4().bytes * (700 * 1024)
+    r = my_client.set_stream('foo_big', io.BytesIO(big_value), part_size=5 * 1024 * 1024)
+    assert r is True, "Expected True, got {}".format(r)
+    big_value_back = io.BytesIO()
+    r = my_client.get_into('foo_big', big_value_back, part_size=5 * 1024 * 1024)
+    assert r == len(big_value), "Expected {} bytes, got {}".format(len(big_value), r)
+    assert big_value_back.getvalue() == big_value, "Streamed value does not match"
+    r = my_client.get_stream(str(uuid.uuid4()))
+    assert r is None, "Expected None, got {}".format(r)
+    # with the bloom filter on, misses don't hit s3, and keys set through the client are found
+    bloom_client = redis3Client(cache_name=cache_name, db=0, verbose=False, bloom_filter=True, **kwargs)
+    r = bloom_client.build_bloom_filter()
+    assert r >= len(key_list), "Expected at least {} keys in the filter, got {}".format(len(key_list), r)
+    r = bloom_client.get(str(uuid.uuid4()))
+    assert r is None, "Expected None, got {}".format(r)
+    r = bloom_client.mget([str(uuid.uuid4()) for _ in range(5)] + key_list[:1])
+    assert r == [None] * 5 + val_list[:1], "Unexpected values {}".format(r)
+    stats = bloom_client.bloom_stats
+    assert stats['lookups'] == 7, "Expected 7 lookups, got {}".format(stats)
+    # with 1% false positives, all 6 misses are very likely avoided
+    assert stats['avoided'] >= 5, "Expected at least 5 avoided lookups, got {}".format(stats)
+    bloom_key = 'bloom_{}'.format(uuid.uuid4())
+    bloom_client.set(bloom_key, 'bar')
+    r = bloom_client.get(bloom_key)
+    assert r == 'bar', "Expected 'bar', got {}".format(r)
+    assert bloom_client.exists(bloom_key), "Expected {} to exist".format(bloom_key)
+    assert bloom_client.save_bloom_filter() is True, "Expected the filter to be saved"
+    bloom_client.delete(bloom_key)
+    # a client that writes before its first read still finds the key once the (older)
+    # persisted filter is loaded
+    writer_client = redis3Client(cache_name=cache_name, db=0, verbose=False, bloom_filter=True, **kwargs)
+    bloom_key = 'bloom_{}'.format(uuid.uuid4())
+    writer_client.set(bloom_key, 'bar')
+    start = time()
+    while writer_client.bloom_stats['lookups'] == 0 and time() - start < 30:
+        r = writer_client.get(bloom_key)
+        assert r == 'bar', "Expected 'bar', got {}".format(r)
+        sleep(0.1)
+    assert writer_client.bloom_stats['lookups'] > 0, "Expected the filter to be loaded"
+    r = writer_client.get(bloom_key)
+    assert r == 'bar', "Expected 'bar', got {}".format(r)
+    writer_client.delete(bloom_key)
+    # dump the db to a local archive and restore it into another db
+    with tempfile.TemporaryDirectory() as archive_dir:
+        stats = my_client.dump_db(archive_dir, chunk_size=2)
+        assert stats['keys'] >= len(key_list) + 1, "Expected at least {} keys dumped, got {}".format(len(key_list) + 1, stats)
+        restore_client = redis3Client(cache_name=cache_name, db=200, verbose=False, **kwargs)
+        for k in restore_client.keys():
+            restore_client.delete(k)
+        # make the restore fail halfway (a chunk is missing), then resume it
+        os.rename(os.path.join(archive_dir, 'chunk_000001'), os.path.join(archive_dir, 'missing'))
+        try:
+            restore_client.restore_db(archive_dir)
+            assert False, "Expected the restore to fail"
+        except FileNotFoundError:
+            pass
+        os.rename(os.path.join(archive_dir, 'missing'), os.path.join(archive_dir, 'chunk_000001'))
+        r = restore_client.restore_db(archive_dir)
+        assert r['chunks'] == stats['chunks'] - 1, "Expected the restore to resume, got {}".format(r)
+        r = restore_client.mget(key_list + ['foo_dic'])
+        assert r == val_list + [json.dumps(my_obj)], "Unexpected restored values {}".format(r)
+        r = sorted(restore_client.keys())
+        assert r == sorted(my_client.keys()), "Restored keys don't match the dumped ones"
+        # restore again without overwriting a key we changed in the meantime
+        restore_client.set(key_list[0], 'changed')
+        r = restore_client.restore_db(archive_dir, skip_existing=True)
+        assert r['keys'] == 0 and r['skipped'] == stats['keys'], "Expected all keys skipped, got {}".format(r)
+        assert restore_client.get(key_list[0]) == 'changed', "Expected the existing key not to be overwritten"
+        for k in restore_client.keys():
+            restore_client.delete(k)
+    # server-side copy / rename / move, in two scratch dbs
+    src_client = redis3Client(cache_name=cache_name, db=300, verbose=False, **kwargs)
+    dst_client = redis3Client(cache_name=cache_name, db=301, verbose=False, **kwargs)
+    for c in (src_client, dst_client):
+        for k in c.keys():
+            c.delete(k)
+    src_client.mset(key_list, val_list)
+    assert src_client.copy(key_list[0], 'copied') is True, "Expected a copy"
+    assert src_client.get('copied') == val_list[0], "Expected the copied value"
+    assert src_client.copy(key_list[1], 'copied') is False, "Expected no copy over an existing key"
+    assert src_client.copy(key_list[1], 'copied', replace=True) is True, "Expected a copy with replace"
+    assert src_client.get('copied') == val_list[1], "Expected the replaced value"
+    assert src_client.copy(str(uuid.uuid4()), 'copied', replace=True) is False, "Expected no copy of a missing key"
+    assert src_client.copy('copied', 'copied', replace=True) is True, "Expected a copy onto itself to be a no-op"
+    assert src_client.rename('copied', 'renamed') is True, "Expected a rename"
+    assert src_client.get('copied') is None and src_client.get('renamed') == val_list[1], "Unexpected rename"
+    assert src_client.rename('renamed', 'renamed') is True, "Expected a rename onto itself to be a no-op"
+    assert src_client.rename(str(uuid.uuid4()), 'renamed') is False, "Expected no rename of a missing key"
+    assert src_client.move('renamed', 301) is True, "Expected a move"
+    assert src_client.move(key_list[0], 300) is False, "Expected no move to the current db"
+    assert dst_client.get('renamed') == val_list[1] and not src_client.exists('renamed'), "Unexpected move"
+    r = src_client.mcopy(key_list[:2], ['mcopied_0', 'mcopied_1'])
+    assert r == [True, True], "Expected two copies, got {}".format(r)
+    r = src_client.move_db(301, starts_with='playground_')
+    assert r == len(key_list), "Expected {} keys moved, got {}".format(len(key_list), r)
+    assert sorted(src_client.keys()) == ['mcopied_0', 'mcopied_1'], "Expected only the copies left"
+    assert dst_client.mget(key_list) == val_list, "Expected the moved values"
+    for c in (src_client, dst_client):
+        for k in c.keys():
+            c.delete(k)
+    # lists: push at both ends, read ranges back, compact and delete
+    list_key = 'list_{}'.format(uuid.uuid4())
+    assert my_client.llen(list_key) == 0, "Expected an empty list"
+    r = my_client.rpush(list_key, 'a', 'b')
+    assert r == 2, "Expected length 2, got {}".format(r)
+    r = my_client.lpush(list_key, 'y', 'z')
+    assert r == 4, "Expected length 4, got {}".format(r)
+    for i in range(10):
+        my_client.rpush(list_key, 'v_{}'.format(i))
+    expected = ['z', 'y', 'a', 'b'] + ['v_{}'.format(i) for i in range(10)]
+    assert my_client.llen(list_key) == len(expected), "Expected length {}".format(len(expected))
+    r = my_client.lrange(list_key, 0, -1)
+    assert r == expected, "Expected {}, got {}".format(expected, r)
+    r = my_client.lrange(list_key, 1, 4)
+    assert r == expected[1:5], "Expected {}, got {}".format(expected[1:5], r)
+    r = my_client.lrange(list_key, -3, -1)
+    assert r == expected[-3:], "Expected {}, got {}".format(expected[-3:], r)
+    assert my_client.lrange(list_key, 20, 30) == [], "Expected an empty range"
+    # 12 small chunks get merged into one
+    r = my_client.compact_list(list_key)
+    assert r == 11, "Expected 11 chunks removed, got {}".format(r)
+    assert my_client.compact_list(list_key) == 0, "Expected nothing left to compact"
+    r = my_client.lrange(list_key, 0, -1)
+    assert r == expected, "Expected {} after compaction, got {}".format(expected, r)
+    assert list_key not in list(my_client.keys()), "Expected lists not to show up in keys"
+    assert my_client.delete_list(list_key) is True, "Expected True"
+    assert my_client.llen(list_key) == 0, "Expected the list to be deleted"
+    assert my_client.lrange(list_key, 0, -1) == [], "Expected the list to be deleted"
     # use the keys command to get all keys in the cache
     all_keys_in_db = list([k for k in my_client.keys()])
     print("Found {} keys in cache, first three: {}".format(len(all_keys_in_db), all_keys_in_db[:3]))
@@ -0,0 +1,124 @@
+"""
+
+Functional tests of the RESP server (redis3/server.py) with a stock Redis client (redis-py):
+the server runs in a background thread, in front of the cache, and the client talks to it
+as it would to any Redis.
+
+python server_tests.py my-cache-name
+
+or offline, against a local s3 stand-in:
+
+python server_tests.py my-cache-name --endpoint-url http://127.0.0.1:5000
+
+"""
+
+import uuid
+import asyncio
+import argparse
+import threading
+from datetime import datetime
+import redis
+from redis3.redis3 import redis3Client
+from redis3.server import RESPServer
+
+
+def start_server(cache_name: str, port: int, **kwargs):
+    """
+    Start a RESPServer on localhost:port in a daemon thread, and return once it's listening.
+    """
+    client = redis3Client(cache_name=cache_name, db=0, verbose=False, **kwargs)
+    started = threading.Event()
+
+    async def serve():
+        server = await RESPServer(client).start('127.0.0.1', port)
+        started.set()
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(target=lambda: asyncio.run(serve()), daemon=True).start()
+    assert started.wait(timeout=30), "Server did not start"
+    return client
+
+
+def run_server_tests(
+    cache_name: str, # name of the cache to use
+    port: int = 6399,
+    **kwargs
+):
+    print("Started server tests at {}\n".format(datetime.now()))
+    start_server(cache_name, port, **kwargs)
+    r = redis.Redis(host='127.0.0.1', port=port, decode_responses=True)
+
+    assert r.ping() is True, "Expected PONG"
+    # set a key and get it back
+    key = 'server_{}'.format(uuid.uuid4())
+    assert r.set(key, 'bar') is True, "Expected OK"
+    v = r.get(key)
+    assert v == 'bar', "Expected 'bar', got {}".format(v)
+    v = r.get(str(uuid.uuid4()))
+    assert v is None, "Expected None, got {}".format(v)
+    # multi-key commands
+    key_list = ['{}_{}'.format(key, i) for i in range(5)]
+    val_list = ['bar_{}'.format(i) for i in range(5)]
+    assert r.mset(dict(zip(key_list, val_list))) is True, "Expected OK"
+    v = r.mget(key_list)
+    assert v == val_list, "Expected {}, got {}".format(val_list, v)
+    v = r.exists(*key_list, str(uuid.uuid4()))
+    assert v == 5, "Expected 5, got {}".format(v)
+    v = sorted(r.keys('{}_*'.format(key)))
+    assert v == key_list, "Expected {}, got {}".format(key_list, v)
+    v = sorted(r.scan_iter(match='{}_*'.format(key), count=2))
+    assert v == key_list, "Expected {}, got {}".format(key_list, v)
+    # default pipelines are MULTI / EXEC blocks
+    pipe = r.pipeline()
+    for k in key_list:
+        pipe.set(k, k)
+    pipe.get(key_list[0])
+    v = pipe.execute()
+    assert v == [True] * 5 + [key_list[0]], "Unexpected pipeline replies {}".format(v)
+    # and without transaction, a plain pipeline
+    pipe = r.pipeline(transaction=False)
+    for k in key_list:
+        pipe.get(k)
+    v = pipe.execute()
+    assert v == key_list, "Expected {}, got {}".format(key_list, v)
+    # unknown commands abort the whole block, and nothing runs
+    pipe = r.pipeline()
+    pipe.set(key, 'not_set')
+    pipe.execute_command('NOT_A_COMMAND')
+    try:
+        pipe.execute()
+        assert False, "Expected an error"
+    except redis.exceptions.ResponseError:
+        pass
+    v = r.get(key)
+    assert v == 'bar', "Expected 'bar', got {}".format(v)
+    # server-side copy / rename / move
+    assert r.copy(key, key + '_copy') is True, "Expected a copy"
+    assert r.rename(key, key) is True, "Expected a rename onto itself to be a no-op"
+    assert r.rename(key + '_copy', key + '_renamed') is True, "Expected OK"
+    assert r.move(key + '_renamed', 1) is True, "Expected a move"
+    assert r.exists(key + '_renamed') == 0, "Expected the key to be moved"
+    # select the db we moved the key to (on a new connection, which keeps its db)
+    r1 = redis.Redis(host='127.0.0.1', port=port, db=1, decode_responses=True)
+    v = r1.get(key + '_renamed')
+    assert v == 'bar', "Expected 'bar', got {}".format(v)
+    # delete everything (DEL returns how many keys were there)
+    assert r1.delete(key + '_renamed') == 1, "Expected 1 deleted key"
+    v = r.delete(key, *key_list, key_list[0], str(uuid.uuid4()))
+    assert v == 6, "Expected 6 deleted keys, got {}".format(v)
+    assert r.get(key) is None, "Expected the key to be deleted"
+
+    print("\nFinished server tests at {}. See you, s3ace cowboy".format(datetime.now()))
+    return
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test the RESP server with a stock Redis client")
+    parser.add_argument('cache_name')
+    parser.add_argument('--port', type=int, default=6399, help="port for the test server")
+    parser.add_argument('--endpoint-url', default=None, help="s3 endpoint, e.g. a local s3 stand-in")
+    args = parser.parse_args()
+
+    client_kwargs = {'endpoint_url': args.endpoint_url} if args.endpoint_url else {}
+    run_server_tests(args.cache_name, port=args.port, **client_kwargs)